@@ -52,6 +52,7 @@ import matplotlib.pyplot as plt
 from bars import all_bars
 from switches import all_switches
 from map_res import gen_map
+from results import clear_results
 
 
 def pltrcparams():
@@ -96,6 +97,8 @@ def plot_results(fmt):
                 fname = line.split()[0]
                 bar_file = all_bars(fname, fmt)
                 switch_file = all_switches(fname, fmt)
+                # the csv files of this run are not needed anymore
+                clear_results(fname)
                 os.rename(bar_file, f"{ln}-b")
                 os.rename(switch_file, f"{ln}-s")
 
@@ -119,6 +122,7 @@ def plot_maps(fmt):
                                    "../softwareX/samples",
                                    "../softwareX/cb_2018_us_state_20m",
                                    fmt)
+                clear_results(fname)
 
                 os.rename(map_file, f"{ln}-map.{fmt}")
                 newline = line.rstrip() + "\t" + f"{ln}-map.{fmt}" + "\n"
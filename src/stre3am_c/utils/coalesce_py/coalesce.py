@@ -48,20 +48,29 @@
 #80#############################################################################
 
 import pandas as pd
-import os, sys
+import os, sys, getopt
+import hashlib, pickle, shutil
+from concurrent.futures import ProcessPoolExecutor
 
 # Notes:
 # Root directory contains a several of folders
 # Each folder contains 4 cases
 # Within each folder there should be a _stats.xlsx file
 
+# file with the cases already read by the incremental mode
+MANIFEST = "coalesce_manifest.pkl"
+
+# output files, the columnar one is a parquet data set partitioned by sheet
+XLSX_OUT = "coalesce.xlsx"
+PARQUET_OUT = "coalesce.parquet"
+
 def getCurFold(path: str = ".") -> list:
-    """Gets the current folder path.
+    """Gets the current folder path (without the parquet output).
     """
     result = []
     for _, dirs, _ in os.walk(path):
         break
-    return sorted(dirs)
+    return sorted(d for d in dirs if d != PARQUET_OUT)
 
 def get_folders(directory) -> dict:
     """Gets all the folders in the current directory.
@@ -92,18 +101,216 @@ def get_folders(directory) -> dict:
     return actDict
 
 
-def coalesce():
-    """Read the excel files contents and get the summary file.
+def pmap(func, items: list, jobs: int = 1) -> list:
+    """Map `func` over `items`, in a process pool if `jobs` > 1. The results
+    always come back in the order of `items`.
     """
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as ex:
+            return list(ex.map(func, items))
+    return [func(i) for i in items]
+
+
+def read_workbook(ef: str) -> dict:
+    """Read all the sheets of a single case workbook.
+    """
+    # sheet_name=None reads every sheet in a single pass over the file
+    return pd.read_excel(ef, sheet_name=None, header=None)
+
+
+def load_workbooks(files: list, jobs: int = 1) -> dict:
+    """Open every case workbook once and keep all its sheets in memory.
+    The cache is keyed by (case file, sheet name).
+    """
+    cache = {}
+    for ef, sheets in zip(files, pmap(read_workbook, files, jobs)):
+        for sh_n, df in sheets.items():
+            cache[(ef, sh_n)] = df
+    return cache
+
+
+def file_hash(ef: str) -> str:
+    """Hash of the contents of a case workbook.
+    """
+    h = hashlib.sha1()
+    with open(ef, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_manifest(path: str = MANIFEST) -> dict:
+    """Load the manifest of the incremental mode: "cases" has for every case
+    workbook its mtime, size, hash and the sheets that were read from it,
+    "outputs" the mtime of every output that was built from those cases. An
+    unreadable manifest, or one with any other layout, is treated as an empty
+    one (i.e. everything is built again).
+    """
+    manifest = {"cases": {}, "outputs": {}}
+    if not os.path.isfile(path):
+        return manifest
+    try:
+        with open(path, "rb") as f:
+            stored = pickle.load(f)
+    except (EOFError, pickle.UnpicklingError, AttributeError, ImportError,
+            ValueError):
+        print(f"could not read {path}, all the cases are parsed again")
+        return manifest
+    if not (isinstance(stored, dict) and set(stored) == set(manifest)
+            and all(isinstance(v, dict) for v in stored.values())):
+        print(f"unexpected layout in {path}, all the cases are parsed again")
+        return manifest
+    return stored
+
+
+def save_manifest(manifest: dict, path: str = MANIFEST) -> None:
+    """Write the manifest of the incremental mode (to a temporary file that
+    then replaces it, so an interrupted write keeps the previous one).
+    """
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(manifest, f)
+    os.replace(tmp, path)
+
+
+def output_mtime(path: str):
+    """mtime of an output, the newest file for the parquet data set. None if
+    the output does not exist.
+    """
+    if os.path.isdir(path):
+        return max((os.path.getmtime(os.path.join(d, f))
+                    for d, _, files in os.walk(path) for f in files),
+                   default=None)
+    if os.path.isfile(path):
+        return os.path.getmtime(path)
+    return None
+
+
+def update_manifest(files: list, manifest: dict, jobs: int = 1) -> list:
+    """Parse only the case workbooks that are new or that changed since they
+    were put in the manifest, and drop the ones that are gone. Returns the
+    list of parsed files.
+    """
+    stale = []
+    for ef in files:
+        st = os.stat(ef)
+        entry = manifest.get(ef)
+        if (entry is not None and entry["mtime"] == st.st_mtime
+                and entry["size"] == st.st_size):
+            continue
+        h = file_hash(ef)
+        if entry is not None and entry["hash"] == h:
+            #: touched but same contents
+            entry["mtime"] = st.st_mtime
+            continue
+        manifest[ef] = {"mtime": st.st_mtime, "size": st.st_size, "hash": h}
+        stale.append(ef)
+    for ef, sheets in zip(stale, pmap(read_workbook, stale, jobs)):
+        manifest[ef]["sheets"] = sheets
+    for ef in [ef for ef in manifest.keys() if ef not in files]:
+        del manifest[ef]
+    return stale
+
+
+def merge_cases(frames: list, heads: list, sheet: str = "") -> pd.DataFrame:
+    """Align all the per-case frames on the row label (column 0) with a
+    single concat. Rows come out sorted by label, as with the outer merge.
+    If a case has repeated row labels the concat can not align them, then
+    the cases are joined with the (slower) outer merge.
+    """
+    renamed = []
+    for df1, head in zip(frames, heads):
+        if len(df1.columns) == 2:
+            cols = [0, head]
+        else:
+            cols = [0] + [f"{head}_{c}" for c in df1.columns[1:]]
+        renamed.append(df1.set_axis(cols, axis=1))
+    dup = [head for df1, head in zip(renamed, heads)
+           if df1[0].duplicated().any()]
+    if dup:
+        print(f"repeated row labels in sheet {sheet} of {', '.join(dup)}, "
+              "using the outer merge")
+        df0 = renamed[0]
+        for df1 in renamed[1:]:
+            df0 = pd.merge(df0, df1, on=0, how="outer")
+        return df0
+    df0 = pd.concat([df1.set_index(0) for df1 in renamed], axis=1,
+                    join="outer", sort=True)
+    return df0.reset_index()
+
+
+def to_long(df0: pd.DataFrame, sh_n: str) -> pd.DataFrame:
+    """Reshape a coalesced sheet into the long format, i.e. one row per
+    (sheet, row label, case) with its value. Non numeric values are dropped,
+    `row` keeps the position of the label in the sheet.
+    """
+    d = df0.rename(columns={0: "label"})
+    d.insert(0, "row", range(d.shape[0]))
+    d = d.melt(id_vars=["row", "label"], var_name="case", value_name="value")
+    d["value"] = pd.to_numeric(d["value"], errors="coerce")
+    d = d.dropna(subset=["value"])
+    d["label"] = d["label"].astype(str)
+    d["case"] = d["case"].astype(str)
+    d.insert(0, "sheet", sh_n)
+    return d
+
+
+def write_excel(out: dict, path: str = XLSX_OUT) -> None:
+    """Write all the coalesced sheets to the summary workbook in one go.
+    """
+    with pd.ExcelWriter(path, mode="w") as writer:
+        df = pd.DataFrame(["next sheet"])
+        df.to_excel(writer, sheet_name="next")
+        for sh_n, df0 in out.items():
+            df0.to_excel(writer, sheet_name=f"{sh_n}")
+
+
+def write_columnar(out: dict, path: str = PARQUET_OUT) -> None:
+    """Write all the coalesced sheets as a single long format parquet data
+    set, partitioned by sheet. This needs pyarrow.
+    """
+    d = pd.concat([to_long(df0, sh_n) for sh_n, df0 in out.items()],
+                  ignore_index=True)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    d.to_parquet(path, partition_cols=["sheet"], index=False)
+
+
+def read_columnar(path: str = PARQUET_OUT, sheets: list = None,
+                  columns: list = None) -> pd.DataFrame:
+    """Read (memory mapped) some sheets and columns of the long format data
+    set, e.g. `read_columnar(sheets=["old_co2"], columns=["case", "value"])`.
+    The sheet names come back as strings rather than the partition category.
+    """
+    filters = [("sheet", "in", list(sheets))] if sheets else None
+    d = pd.read_parquet(path, columns=columns, filters=filters,
+                        memory_map=True)
+    if "sheet" in d.columns:
+        d["sheet"] = d["sheet"].astype(str)
+    return d
+
+
+def coalesce(jobs: int = 1, incremental: bool = False, fmt: str = "xlsx"):
+    """Read the excel files contents and get the summary file. With `jobs`
+    > 1 the case workbooks are parsed by a pool of processes, the merge is
+    still done here so the output does not depend on the worker order.
+    With `incremental` only the cases that are not in the manifest (or that
+    changed) are parsed. `fmt` is the output, "xlsx", "parquet" or "both".
+    """
+    if fmt not in ("xlsx", "parquet", "both"):
+        raise Exception("fmt has to be xlsx, parquet, or both")
+    outputs = []
+    if fmt in ("xlsx", "both"):
+        outputs.append(XLSX_OUT)
+    if fmt in ("parquet", "both"):
+        outputs.append(PARQUET_OUT)
     # A file can be "cb", "bau", "c350", and "c500"
     #
     folders = getCurFold()
-    listOfFileDict = []
+    listOfFileDict = pmap(get_folders, folders, jobs)
     lef0 = []
     titles = []
-    for f in folders:
-        filesDict = get_folders(f)
-        listOfFileDict.append(filesDict)
+    for f, filesDict in zip(folders, listOfFileDict):
         print(f"the mf folder {f}")
         for k in filesDict.keys():
             print(f"\t{k}")
@@ -111,45 +318,83 @@ def coalesce():
             titles.append(k)
 
 
+    if incremental:
+        manifest = load_manifest()
+        cases = manifest["cases"]
+        n_man = len(cases)
+        stale = update_manifest(lef0, cases, jobs)
+        print(f"{len(stale)} new or changed cases")
+        if len(stale) > 0 or len(cases) != n_man:
+            manifest["outputs"] = {}
+        built = manifest["outputs"]
+        outputs = [o for o in outputs
+                   if built.get(o) is None or built[o] != output_mtime(o)]
+        if len(outputs) == 0:
+            save_manifest(manifest)
+            print("output is up to date")
+            return
+        cache = {(ef, sh_n): df for ef in lef0
+                 for sh_n, df in cases[ef]["sheets"].items()}
+    else:
+        cache = load_workbooks(lef0, jobs)
     # we need to know the spreadsheet names first
-    pdef = pd.ExcelFile(lef0[0])
-    sheet_names = pdef.sheet_names
-    with pd.ExcelWriter("coalesce.xlsx", mode="w") as writer:
-        df = pd.DataFrame(["next sheet"])
-        df.to_excel(writer, sheet_name="next")
+    sheet_names = [sh_n for (ef, sh_n) in cache.keys() if ef == lef0[0]]
 
+    out = {}
     for sh_n in sheet_names:
         #if sh_n != "ccost_retro":
         #    continue
         #d0 = pd.DataFrame()
-        k = 0
-        lef = lef0.copy()
-        titlesl = titles.copy()
-        while len(lef) != 0:
-            ef = lef.pop()
-            pdef = pd.ExcelFile(ef)
-            head = titlesl.pop()
-            # read the dataframe
-            df1 = pdef.parse(sheet_name=sh_n, header=None)
-            #: justfornow
-            if len(df1.columns) == 2:
-                df1.columns = [0, head]
-            if k != 0:
-                df0 = pd.merge(df0, df1, on=0, how="outer")
-            else:
-                df0 = df1
-            k += 1
+        # the cases go in reverse order, i.e. the last case is the first column
+        frames = [cache[(ef, sh_n)] for ef in reversed(lef0)]
+        df0 = merge_cases(frames, titles[::-1], sh_n)
         print(df0.iloc[1,0])
         if df0.iloc[1,0] == "sum":
             rn = df0.shape[0]
             df0.iloc[1,:], df0.iloc[rn-1,:] = df0.iloc[rn-1,:].copy(), df0.iloc[1, :]
+        out[sh_n] = df0
+
+    if PARQUET_OUT in outputs:
+        write_columnar(out)
+    if XLSX_OUT in outputs:
+        write_excel(out)
+    if incremental:
+        #: only now the outputs match the cases of the manifest
+        for o in outputs:
+            built[o] = output_mtime(o)
+        save_manifest(manifest)
 
-        with pd.ExcelWriter("coalesce.xlsx", mode="a") as writer:
-            df0.to_excel(writer, sheet_name=f"{sh_n}")
 
 
+def main(argv):
+    """Run the coalesce. Optional command line arguments:
+    `-j N` (or `--jobs N`) to parse the case workbooks with N processes.
+    `-u` (or `--incremental`) to only parse the new or changed cases.
+    `-f xlsx|parquet|both` (or `--format`) to pick the output.
+    """
+    jobs = 1
+    incremental = False
+    fmt = "xlsx"
+    usage = "coalesce.py -j <jobs> -u -f <xlsx|parquet|both>"
+    try:
+        opts, args = getopt.getopt(argv, "hj:uf:",
+                                   ["jobs=", "incremental", "format="])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == "-h":
+            print(usage)
+            sys.exit()
+        elif opt in ("-j", "--jobs"):
+            jobs = int(arg)
+        elif opt in ("-u", "--incremental"):
+            incremental = True
+        elif opt in ("-f", "--format"):
+            fmt = arg
+    coalesce(jobs=jobs, incremental=incremental, fmt=fmt)
 
 
 if __name__ == "__main__":
-    coalesce()
+    main(sys.argv[1:])
 
@@ -46,8 +46,15 @@
 #
 #80#############################################################################
 
-import os, fnmatch
+import os, fnmatch, pickle
+import numpy as np
+import pandas as pd
+import matplotlib as mpl
+from openpyxl import load_workbook
+from concurrent.futures import ProcessPoolExecutor
 from typing import Tuple
+from collections.abc import Mapping
+from stackD import stackedBars, cycleColors
 
 
 # number of technologies
@@ -84,37 +91,193 @@ colList = ["berry", "blood", "blueberry", "blurple",
         "primary blue", "cool blue", "cobalt"]
 
 # default colour list
-colL = greyes
+colL = ["xkcd:" + c for c in greyes]
 
 # base type of tech, e.g. existing (w), rf (z), and new (x)
 names = ["w", "uw", "z", "uz", "x", "ux"]
 namesW = ["w", "z", "x"]
 
 # filling patterns
-for i in range(len(colL)):
-    colL[i] = "xkcd:" + colL[i]
 hatches = ['/', '\\', '|', '-', '+', 'x', 'o', 'O', '.', '*']
 
 
+# index of the files in each run directory, keyed by the absolute path
+fileIndex = {}
+
+
+def refreshFiles(path: str=".") -> dict:
+    """Walk through the run directory once and (re)build its file index.
+    """
+    files = []
+    for root, dirs, names in os.walk(path):
+        for name in names:
+            files.append((name, os.path.join(root, name)))
+    idx = {"files": files, "found": {}}
+    fileIndex[os.path.abspath(path)] = idx
+    return idx
+
+
+def invalidateFiles(path: str=None) -> None:
+    """Forget the file index of a run directory, or all of them if no path
+    is given. The next getFiles call walks the directory again.
+    """
+    if path is None:
+        fileIndex.clear()
+    else:
+        fileIndex.pop(os.path.abspath(path), None)
+
+
 def getFiles(pattern: str, path: str="."):
-    """Walk through the current directory to find the required files.
+    """Find the required file in the current directory. The directory is
+    only walked the first time, then the lookups use the file index.
     """
-    result = []
-    for root, dirs, files in os.walk(path):
-        for name in files:
+    idx = fileIndex.get(os.path.abspath(path))
+    if idx is None:
+        idx = refreshFiles(path)
+    found = idx["found"]
+    if pattern not in found:
+        found[pattern] = None
+        for name, fullName in idx["files"]:
             if fnmatch.fnmatch(name, pattern):
-                result.append(os.path.join(root, name))
-                print("Using file {}".format(os.path.join(root, name)))
-                return os.path.join(root, name)
-    return None
+                found[pattern] = fullName
+                break
+    if found[pattern] is not None:
+        print("Using file {}".format(found[pattern]))
+    return found[pattern]
+
+
+
+# sheets of the workbooks already read by this process
+workbookIndex = {}
+
+
+def readWorkbook(fileName: str) -> dict:
+    """Return all the sheets of an xlsx file. The first time, the sheets are
+    stored in a binary file next to the workbook (keyed by its mtime), then
+    the following reads load that file instead of parsing the xlsx.
+    """
+    mtime = os.path.getmtime(fileName)
+    key = os.path.abspath(fileName)
+    if key in workbookIndex and workbookIndex[key]["mtime"] == mtime:
+        return workbookIndex[key]["sheets"]
+    cacheName = fileName + ".pkl"
+    stored = None
+    if os.path.isfile(cacheName):
+        try:
+            with open(cacheName, "rb") as f:
+                stored = pickle.load(f)
+        except (EOFError, pickle.UnpicklingError, AttributeError,
+                ImportError, ValueError):
+            print("Could not read the cache {}".format(cacheName))
+    if stored is not None and stored["mtime"] == mtime:
+        workbookIndex[key] = stored
+        return stored["sheets"]
+    sheets = pd.read_excel(fileName, sheet_name=None)
+    workbookIndex[key] = {"mtime": mtime, "sheets": sheets}
+    # written to a temporary file first, so an interrupted write (or another
+    # process writing the same cache) never leaves a truncated one
+    tmpName = "{}.{}.tmp".format(cacheName, os.getpid())
+    try:
+        with open(tmpName, "wb") as f:
+            pickle.dump({"mtime": mtime, "sheets": sheets}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpName, cacheName)
+    except OSError:
+        print("Could not write the cache {}".format(cacheName))
+        if os.path.isfile(tmpName):
+            os.remove(tmpName)
+    return sheets
 
 
+# row sums of the workbooks already streamed by this process
+rowSumIndex = {}
 
-def loadKinds() -> Tuple[list, list]:
+# tables derived from the workbooks of a run (e.g. the retirement summary of
+# pltBar), by the absolute path of the run prefix, with the workbook mtimes
+summaryIndex = {}
+
+
+def streamRowSums(fileName: str, sheets: list) -> dict:
+    """Sum every row of the given sheets of an xlsx file over its columns
+    (e.g. over age), the first column is the index. The workbook is streamed
+    in read-only mode, only the sums are kept, so the full sheets are never
+    in memory. Returns a dict of pd.Series by sheet.
+    """
+    mtime = os.path.getmtime(fileName)
+    key = os.path.abspath(fileName)
+    stored = rowSumIndex.get(key)
+    if stored is None or stored["mtime"] != mtime:
+        stored = {"mtime": mtime, "sums": {}}
+        rowSumIndex[key] = stored
+    missing = [s for s in sheets if s not in stored["sums"]]
+    if missing:
+        wb = load_workbook(fileName, read_only=True, data_only=True)
+        try:
+            for sheet in missing:
+                index, sums = [], []
+                rows = wb[sheet].iter_rows(min_row=2, values_only=True)
+                for row in rows:
+                    if row[0] is None:
+                        continue
+                    index.append(row[0])
+                    sums.append(sum(v for v in row[1:]
+                                    if isinstance(v, (int, float))))
+                stored["sums"][sheet] = pd.Series(sums, index=index,
+                                                  dtype=float)
+        finally:
+            wb.close()
+    return {s: stored["sums"][s] for s in sheets}
+
+
+def clearWorkbooks(path: str=None) -> None:
+    """Forget the workbooks (with their row sums and summaries) read from a
+    run directory, the binary caches on disk are kept, or all of them if no
+    path is given.
+    """
+    if path is None:
+        workbookIndex.clear()
+        rowSumIndex.clear()
+        summaryIndex.clear()
+        return
+    path = os.path.join(os.path.abspath(path), "")
+    for index in (workbookIndex, rowSumIndex, summaryIndex):
+        for key in [k for k in index if k.startswith(path)]:
+            del index[key]
+
+
+def readExcel(fileName: str, sheet_name=0, index_col: int=None):
+    """Same as pd.read_excel (for the arguments used by the plots), but the
+    sheets come from the binary cache of readWorkbook.
+    """
+    sheets = readWorkbook(fileName)
+    sheetNames = list(sheets.keys())
+    if sheet_name is None:
+        keys = sheetNames
+    elif isinstance(sheet_name, list):
+        keys = sheet_name
+    else:
+        keys = [sheet_name]
+    dfs = {}
+    for key in keys:
+        df = sheets[sheetNames[key] if isinstance(key, int) else key].copy()
+        if index_col is not None:
+            df = df.set_index(df.columns[index_col])
+            df.columns = pd.Index(df.columns.tolist()) # infer the type again
+            if str(df.index.name).startswith("Unnamed"):
+                df.index.name = None
+        dfs[key] = df
+    if sheet_name is None or isinstance(sheet_name, list):
+        return dfs
+    return dfs[sheet_name]
+
+
+def loadKinds(path: str=".") -> Tuple[list, list]:
     """Open the _kinds.txt file and check for the kinds of existing plant
     retrofits and new plants.
     """
-    filename = getFiles("*_kinds.txt")
+    filename = getFiles("*_kinds.txt", path=path)
+    if not filename:
+        raise Exception("*_kinds.txt not found")
     kinds_z = list()
     kinds_x = list()
 
@@ -131,13 +294,39 @@ def loadKinds() -> Tuple[list, list]:
                 d.append(int(l))
     return (kinds_z, kinds_x)
 
-# generate the rf and new kinds lists
-(kinds_z, kinds_x) = loadKinds()
+
+# kinds dictionaries of each run directory, keyed by the absolute path
+kindsIndex = {}
+
+
+def getKinds(path: str=".") -> dict:
+    """Return the kinds dictionary of the run directory. The _kinds.txt file
+    is only read the first time.
+    """
+    key = os.path.abspath(path)
+    if key not in kindsIndex:
+        (kinds_z, kinds_x) = loadKinds(path)
+        kindsIndex[key] = {"z": kinds_z, "x": kinds_x, "uz": kinds_z,
+                           "ux": kinds_x, "w": kinds_w, "uw": kinds_w}
+    return kindsIndex[key]
+
+
+class LazyKinds(Mapping):
+    """Kinds dictionary of the current directory, it is only loaded when it
+    is accessed, so importing this module does not touch the files.
+    """
+    def __getitem__(self, name):
+        return getKinds()[name]
+
+    def __iter__(self):
+        return iter(getKinds())
+
+    def __len__(self):
+        return len(getKinds())
+
 
 # kinds dictionary
-kinds = {}
-kinds = {"z": kinds_z, "x": kinds_x, "uz": kinds_z, "ux": kinds_x, "w": kinds_w,
-         "uw": kinds_w}
+kinds = LazyKinds()
 
 
 def export_legend(legend, filename="legend.png"):
@@ -151,3 +340,83 @@ def export_legend(legend, filename="legend.png"):
     )
     fig.savefig(filename, dpi=300, bbox_inches=bbox)
 
+
+# rendering profiles: "tex" (LaTeX) for the publication figures and "fast"
+# (matplotlib mathtext) for batch runs, the default can be set with the
+# STRE3AM_PLOT_PROFILE environment variable
+renderProfiles = {
+    "tex": {"text.usetex": True},
+    "fast": {"text.usetex": False,
+             "mathtext.fontset": "custom",
+             "mathtext.rm": "serif",
+             "mathtext.it": "serif:italic",
+             "mathtext.bf": "serif:bold"},
+}
+renderFonts = {
+    "tex": ["Palatino"],
+    "fast": ["Palatino", "Palatino Linotype", "TeX Gyre Pagella",
+             "URW Palladio L", "DejaVu Serif"],
+}
+renderProfile = os.environ.get("STRE3AM_PLOT_PROFILE", "tex")
+
+
+def setRenderProfile(profile: str=None, serif: bool=True) -> None:
+    """Set the matplotlib parameters of a rendering profile ("tex" or "fast",
+    the current one if None). With `serif` the Palatino fonts are used.
+    """
+    global renderProfile
+    profile = renderProfile if profile is None else profile
+    if profile not in renderProfiles:
+        raise Exception("unknown render profile {}".format(profile))
+    renderProfile = profile
+    mpl.rcParams.update(renderProfiles[profile])
+    if serif:
+        mpl.rcParams.update({"font.family": "serif",
+                             "font.serif": renderFonts[profile]})
+
+
+def texLabel(label: str) -> str:
+    """A label written for LaTeX (e.g. `O\\&M`) as it has to be given to the
+    current rendering profile, mathtext does not need the escape.
+    """
+    if renderProfile == "tex":
+        return label
+    return label.replace("\\&", "&")
+
+
+def initRender(initializer=None, initargs: tuple=()) -> None:
+    """Set up a rendering process, i.e. the Agg backend and the data of the
+    plotting module (with its own `initializer`).
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def setKinds(kindsIdx: dict) -> None:
+    """Give a rendering process the kinds already loaded by the parent.
+    """
+    kindsIndex.update(kindsIdx)
+
+
+def renderJob(job: tuple):
+    """Run a single (function, args) figure job and close its figures.
+    """
+    import matplotlib.pyplot as plt
+    func, args = job
+    out = func(*args)
+    plt.close("all")
+    return out
+
+
+def renderParallel(jobs: list, processes: int=None, initializer=None,
+                   initargs: tuple=()) -> list:
+    """Render independent figures in a pool of processes. `jobs` is a list
+    of (function, args), the functions have to be module level. Returns what
+    every job returned (e.g. the file names) in the order of `jobs`.
+    """
+    with ProcessPoolExecutor(max_workers=processes,
+                             initializer=initRender,
+                             initargs=(initializer, initargs)) as ex:
+        return list(ex.map(renderJob, jobs))
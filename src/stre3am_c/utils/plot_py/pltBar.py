@@ -51,46 +51,96 @@ import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.colors import Normalize as nrm
 from matplotlib.cm import ScalarMappable as smb
-import sys, getopt
+from generalD import readExcel, setRenderProfile, summaryIndex
+import os, sys, getopt
 
 __author__ = "David Thierry"
 
-plt.rcParams.update({
-    "text.usetex": True,
-    "font.family": "serif",
-    "font.serif": ["Palatino"],
-})
+setRenderProfile() #: LaTeX or the fast profile, and the font
+
+
+def retirementSummary(file: str) -> dict:
+    """Relative age x (cost, cap) table of the retired existing capacity of
+    the run `file` (the prefix of its _ret_rel_t.xlsx, _ret_t_ucap.xlsx and
+    _stats.xlsx files), with the new allocation cost and capacity. Built once
+    per run and kept in `summaryIndex` until one of the workbooks changes.
+    """
+    key = os.path.abspath(file)
+    mtime = [os.path.getmtime(file + suffix) for suffix in
+             ["_ret_rel_t.xlsx", "_ret_t_ucap.xlsx", "_stats.xlsx"]]
+    if key in summaryIndex and summaryIndex[key]["mtime"] == mtime:
+        return summaryIndex[key]["summary"]
+    dfCost = readExcel(file + "_ret_rel_t.xlsx")
+    dfUret = readExcel(file + "_ret_t_ucap.xlsx")
+    ages = [round(t, 2) for t in np.linspace(0.1, 1., 10)]
+    table = pd.DataFrame({"cost": dfCost[ages].sum(0),
+                          "cap": dfUret[ages].sum(0)})
+    dfs = readExcel(file + "_stats.xlsx",
+                    sheet_name=["cap_cost_new", "new_alloc"])
+    #: drop the sum bit
+    xcost = dfs["cap_cost_new"].iloc[:-1].sum(0).iloc[1]
+    xcap = dfs["new_alloc"].iloc[:-1].sum(0).iloc[1]
+    summaryIndex[key] = {"mtime": mtime,
+                         "summary": {"table": table, "xcost": xcost,
+                                     "xcap": xcap}}
+    return summaryIndex[key]["summary"]
+
+
+def blockGeometry(table: pd.DataFrame, cmap, norm) -> dict:
+    """Geometry of the variable width blocks, i.e. one block per relative
+    age with the cost as height and the capacity as width, stacked.
+    """
+    height = table["cost"].to_numpy(dtype=float)
+    top = np.cumsum(height)
+    return {"height": height,
+            "width": table["cap"].to_numpy(dtype=float),
+            "bottom": np.concatenate([[0.], top[:-1]]),
+            "top": top[-1],
+            "color": [cmap(norm(t)) for t in table.index]}
+
+
+def drawBlocks(a, geom: dict) -> None:
+    """Draw the blocks of `geom` (see blockGeometry) into the axes `a`.
+    """
+    a.bar(np.zeros(len(geom["height"])), geom["height"],
+          width=geom["width"],
+          bottom=geom["bottom"],
+          align="edge",
+          color=geom["color"],
+          edgecolor="k",
+          linewidth=1.,
+          hatch="/")
 
 
 def main(argv):
     """generate the whole plot. This file needs command line arguments:
-    `-i xxxx`
+    `-i xxxx`, optionally `-r fast` (or `--render fast`) to use mathtext
+    instead of LaTeX. Returns the list of files.
     """
     file = ""
     try:
-        opts, args = getopt.getopt(argv, "hi:o:", ["ifile="])
+        opts, args = getopt.getopt(argv, "hi:o:r:", ["ifile=", "render="])
     except getopt.GetoptError:
-        print("pltBar.py -i <inputfolder>")
+        print("pltBar.py -i <inputfolder> -r <tex|fast>")
         sys.exit(2)
     for opt, arg in opts:
         if opt == "-h":
-            print("pltBar.py -i <inputfolder>")
+            print("pltBar.py -i <inputfolder> -r <tex|fast>")
             sys.exit()
         elif opt in ("-i", "--file"):
             file = arg
             print("file")
             print(file)
+        elif opt in ("-r", "--render"):
+            setRenderProfile(arg)
     print(f"Input folder : {file}")
     CMAP0 = "tab20c"
     cmap = plt.get_cmap("Greens")
     norm = nrm(vmin=0.0, vmax=1.)
 
 
-    dfCost = pd.read_excel(file + "_ret_rel_t.xlsx")
-    dfUret = pd.read_excel(file + "_ret_t_ucap.xlsx")
-    dfProc = pd.DataFrame(0., index=[0, 1], columns=dfCost.columns)
-    dfProc.iloc[0, :] = dfCost.sum(0)
-    dfProc.iloc[1, :] = dfUret.sum(0)
+    summ = retirementSummary(file)
+    geom = blockGeometry(summ["table"], cmap, norm)
 
     # f, a = plt.subplots()
     # base = 0.
@@ -138,29 +188,10 @@ def main(argv):
     f, a = plt.subplots(nrows=1, ncols=2,
                         sharex="all", sharey="all",
                         constrained_layout=True, dpi=200)
-    #: read some dataframes
-    df_xCost = pd.read_excel(file + "_stats.xlsx", sheet_name="cap_cost_new")
-    df_xCap = pd.read_excel(file + "_stats.xlsx", sheet_name="new_alloc")
-    df_xCost.drop(df_xCost.tail(1).index, inplace=True) # drop the sum bit
-    df_xCap.drop(df_xCap.tail(1).index, inplace=True) # drop the sum bit
-    xcost = df_xCost.sum(0)[1]
-    xcap = df_xCap.sum(0)[1]
+    xcost, xcap = summ["xcost"], summ["xcap"]
 
     print("cost {}".format(xcost), "cap {}".format(xcap))
-    base = 0.
-    for t in np.linspace(0.1, 1., 10):
-        c = cmap(norm(t))
-        t = round(t, 2)
-        a[0].bar(0, dfProc.loc[0, t],
-                width=dfProc.loc[1, t],
-                bottom=base,
-                align="edge",
-                color=c,
-                edgecolor="k",
-                linewidth=1.,
-                label=t,
-                 hatch="/")
-        base += dfProc.loc[0, t]
+    drawBlocks(a[0], geom)
     #a[0].legend(title="Relative retirement time")
     a[0].set_xlabel("(GW)")
     a[0].set_ylabel("Cost (Millions \$)")
@@ -177,21 +208,8 @@ def main(argv):
     cb.set_label("Relative Age")
     cb.ax.locator_params(nbins=4)
     cb.ax.set_yticklabels(["Newer", "Older"], rotation=90)
-    base = 0.
-    for t in np.linspace(0.1, 1., 10):
-        c = cmap(norm(t))
-        t = round(t, 2)
-        ax1.bar(0, dfProc.loc[0, t],
-                width=dfProc.loc[1, t],
-                bottom=base,
-                align="edge",
-                color=c,
-                edgecolor="k",
-                linewidth=1.,
-                label=t,
-                hatch="/")
-        base += dfProc.loc[0, t]
-    x1, x2, y1, y2 = 0., dfProc.iloc[1,1:].max()*1.02, 0., base * 1.02
+    drawBlocks(ax1, geom)
+    x1, x2, y1, y2 = 0., geom["width"].max()*1.02, 0., geom["top"] * 1.02
     ax1.set_xlim(x1, x2)
     ax1.set_ylim(y1, y2)
     ax1.locator_params(nbins=3)
@@ -213,6 +231,7 @@ def main(argv):
     #a[1].set_yscale("log")
     #a[1].set_xscale("log")
     f.savefig("blocks_V1.png", format="png")
+    return ["blocks_V1.png"]
 
 
 if __name__ == "__main__":
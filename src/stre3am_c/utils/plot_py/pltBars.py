@@ -50,18 +50,14 @@
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-from readExcelResults import loadExcelOveralls
+from readExcelResults import loadExcelOveralls, loadEmissions
 from matplotlib.colors import Normalize as nrm
 from generalD import *
-import sys
+import os, sys, getopt
 
 __author__ = "David Thierry"
 
-plt.rcParams.update({
-    "text.usetex": True,
-    "font.family": "serif",
-    "font.serif": ["Palatino"],
-})
+setRenderProfile() #: LaTeX or the fast profile, and the font
 
 
 # some global identifiers
@@ -74,8 +70,6 @@ suffix["uw"] = "Ret. old"
 suffix["uz"] = "Ret. RF"
 suffix["ux"] = "Ret. new"
 
-(kinds_z, kinds_x) = loadKinds()
-
 def export_legend(legend, filename="legend.png"):
     """Puts the legend in a different png file
     """
@@ -86,12 +80,15 @@ def export_legend(legend, filename="legend.png"):
     )
     fig.savefig(filename, dpi=300, bbox_inches=bbox)
 
-def stacksSingle(l: list, dmax: float) -> None:
-    """Generates a single stacked plot for every name
+def stacksSingle(l: list, dmax: float) -> list:
+    """Generates a single stacked plot for every name, returns the list of
+    files.
     """
+    kinds_z = kinds["z"]
     n = len(l["w"].columns)
     cmap = plt.get_cmap(CMAP0) #: colour map
     norm = nrm(vmin=0, vmax=I*min(1, max(kinds_z)))
+    files = []
     for name in names:
         df = l[name]
         # format the names/labels
@@ -118,12 +115,17 @@ def stacksSingle(l: list, dmax: float) -> None:
         legend = a.legend(loc=0) #: get the legend and export the legend
         export_legend(legend,
                 "legend_" + name + "_" + efn + "_SingleStack" + ".png")
+        files += [name + "_" + efn + "_SingleStack" + ".png",
+                  "legend_" + name + "_" + efn + "_SingleStack" + ".png"]
+    return files
 
 
-def allStacked(l: dict, dmax: float) -> None:
+def allStacked(l: dict, dmax: float) -> list:
     """Creates a `stacked` plot using the capacity dataframes. This includes
-    all kinds of assets, i.e. existing, retrofitted, and new.
+    all kinds of assets, i.e. existing, retrofitted, and new. Returns the list
+    of files.
     """
+    kinds_z, kinds_x = kinds["z"], kinds["x"]
     all_columns = []
     all_colours = []
     all_labels = []
@@ -245,10 +247,14 @@ def allStacked(l: dict, dmax: float) -> None:
     f.savefig(efn +"_twoliner_.png",
               format="png",
               bbox_inches="tight")
+    return [efn + "_all.png", "legend_" + name + "_" + efn + "_" + ".png",
+            efn + "_twoliner_.png"]
 
-def sBars(l: list) -> None:
-    """Generates a single bar stacked plot for every name
+def sBars(l: list) -> list:
+    """Generates a single bar stacked plot for every name, returns the list of
+    files.
     """
+    kinds_z, kinds_x = kinds["z"], kinds["x"]
     n = len(l["w"].columns)
     cmap = plt.get_cmap(CMAP0)
 
@@ -291,18 +297,15 @@ def sBars(l: list) -> None:
         print(hatches)
         if i == 0:
             base_w = pd.Series([0 for j in df.index])
-        k = 0
-        for col in df.columns:
-            a.bar(df.index+2020, df[col], bottom=base_w,
-                  color=all_colours[k],
-                  label=labels[k],
-                  hatch=hatches[k],
-                  linewidth=0.25,
-                  edgecolor="k",
-                  align="edge")
-            base_w += df[col]
-            yu = max(yu, base_w.max())
-            k += 1
+        k = len(df.columns)
+        bC, base_w = stackedBars(a, df.index+2020, df, bottom=base_w,
+                                 colors=all_colours,
+                                 labels=labels,
+                                 hatches=hatches,
+                                 linewidth=0.25,
+                                 edgecolor="k",
+                                 align="edge")
+        yu = max(yu, base_w.max())
 
         dfu = l["u" + name]
 
@@ -323,25 +326,22 @@ def sBars(l: list) -> None:
         if i == 0:
             base_u = pd.Series([0 for j in dfu.index])
 
-        k = 0
-        for col in dfu.columns:
-            a.bar(dfu.index+2020, -dfu[col], bottom=base_u,
-                  color=all_colours[k],
-                  #label=labels[k],
-                  hatch=hatches[k],
-                  alpha=0.9,
-                  linewidth=0.1,
-                  edgecolor="dimgray",
-                  align="edge")
-            base_u -= dfu[col]
-            yl = min(yl, base_u.min())
-            k += 1
+        k = len(dfu.columns)
+        bC, base_u = stackedBars(a, dfu.index+2020, -dfu, bottom=base_u,
+                                 colors=all_colours,
+                                 #labels=labels,
+                                 hatches=hatches,
+                                 alpha=0.9,
+                                 linewidth=0.1,
+                                 edgecolor="dimgray",
+                                 align="edge")
+        yl = min(yl, base_u.min())
         i += 1
         print("{} bars stacked".format(k))
 
     a.set_xlabel("year")
     a.set_ylabel("GW")
-    a.set_title("Generation capacity \& retirement")
+    a.set_title(texLabel("Generation capacity \& retirement"))
     a.set_xlim(2020, 2051)
     x = a.get_xlim()
     a.axhline(y=0, xmin=0, xmax=31, color="r", lw=0.5)
@@ -358,55 +358,63 @@ def sBars(l: list) -> None:
     #legend = a.legend(loc=0, nrow=11)
     export_legend(legend,
             "legend_" + name + "_" + efn + "_sBarSingle" + ".png")
+    return [efn + "_sBar" + ".png",
+            "legend_" + name + "_" + efn + "_sBarSingle" + ".png"]
 
-def GetEmLine():
-    """Return a pandas dataframe that has the emission line.
-    This looks for the *_em.xlsx file.
+def GetEmLine() -> pd.Series:
+    """Return a pandas series that has the emission line, i.e. the cumulative
+    emissions. This looks for the *_em.xlsx file.
     """
-    lenFuelBased = 0
-    name1 = []
-    for name in namesW:
-        kind = kinds[name]
-        for i in range(I):
-            if not fuelKind[i]:
-                continue
-            for k in range(kind[i]):
-                if name == "w":
-                    sheet0 = name + "e_" + str(i)
-                    lenFuelBased += 1
-                else:
-                    sheet0 = name + "e_" + str(i) + "_" + str(k)
-                name1.append(sheet0)
-
-    norm = nrm(vmin=0, vmax=lenFuelBased)
-    df = pd.DataFrame()
-    em_file = getFiles("*_em.xlsx")
-    print("Using file {}".format(em_file))
-    for name in name1:
-        d = pd.read_excel(em_file, sheet_name=name, index_col=0)
-        if name == name1[0]:
-            df = pd.DataFrame(d.sum(axis=1), columns=[name])
-        else:
-            df.insert(1, name, d.sum(axis=1))
-    ds = df.sum(axis=1)
-    acc = 0e0
-    for k in df.iterrows():
-        acc += ds[k[0]]
-        ds[k[0]] = acc
-    return ds
-    #
+    em = loadEmissions()
+    return pd.Series(em["cumulative"], index=em["time"])
+
 
+# figures that main can generate
+plots = {"sBars": lambda l, dmax: (sBars, (l,)),
+         "allStacked": lambda l, dmax: (allStacked, (l, dmax)),
+         "stacksSingle": lambda l, dmax: (stacksSingle, (l, dmax))}
 
-def main():
+
+def main(argv: list=None) -> list:
+    """Generate the figures. Optional command line arguments: `-p` with a
+    comma separated list of plots (default sBars), `-j N` (or `--jobs N`)
+    to render them with N processes and `-r fast` (or `--render fast`) to use
+    mathtext instead of LaTeX.
+    """
+    argv = argv or []
+    jobs = 1
+    selected = ["sBars"]
+    try:
+        opts, args = getopt.getopt(argv, "hj:p:r:",
+                                   ["jobs=", "plots=", "render="])
+    except getopt.GetoptError:
+        print("pltBars.py -p <plot,plot> -j <jobs> -r <tex|fast>")
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == "-h":
+            print("pltBars.py -p <plot,plot> -j <jobs> -r <tex|fast>")
+            sys.exit()
+        elif opt in ("-j", "--jobs"):
+            jobs = int(arg)
+        elif opt in ("-p", "--plots"):
+            selected = arg.split(",")
+        elif opt in ("-r", "--render"):
+            setRenderProfile(arg)
+            os.environ["STRE3AM_PLOT_PROFILE"] = arg #: for the workers
+    for p in selected:
+        if p not in plots:
+            raise Exception("unknown plot {}".format(p))
     l, dmax = loadExcelOveralls()
-    #allStacked(l, dmax)
-    #stacksSingle(l, dmax)
-    sBars(l)
-    #return l, dmax
+    figJobs = [plots[p](l, dmax) for p in selected]
+    if jobs > 1:
+        files = renderParallel(figJobs, processes=jobs,
+                               initializer=setKinds,
+                               initargs=(dict(kindsIndex),))
+    else:
+        files = [func(*args) for func, args in figJobs]
     #pltEmLine()
+    return [fname for fnames in files for fname in fnames]
 
 
 if __name__ == "__main__":
-    # l, dmax = main()
-    main()
-
+    main(sys.argv[1:])
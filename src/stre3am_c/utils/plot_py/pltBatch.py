@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2023, UChicago Argonne, LLC
+# All Rights Reserved
+# Software Name: STRE3AM: Strategic Technology Roadmapping and Energy,
+# Environmental, and Economic Analysis Model
+# By: Argonne National Laboratory
+# BSD OPEN SOURCE LICENSE
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+
+# ******************************************************************************
+# DISCLAIMER
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ******************************************************************************
+
+# vim: tabstop=2 shiftwidth=2 expandtab colorcolumn=80 tw=80
+# pltBatch.py
+# description: generate the plots of many runs (e.g. a sweep) with a single
+# interpreter, each run gets its own output folder.
+#
+# log:
+#
+#
+#80#############################################################################
+
+import os, sys, getopt, time, shutil, importlib
+import pandas as pd
+import matplotlib as mpl
+from generalD import getFiles, invalidateFiles, clearWorkbooks, \
+    renderParallel, setRenderProfile
+
+# plot families, i.e. (module, function that renders the figures of the run
+# in the current directory and returns the files)
+families = {
+    "bars": ("pltBars", lambda m: m.main([])),
+    "em": ("pltEm", lambda m: m.all_em()),
+    "pertech": ("pltPerTech", lambda m: m.main(["-t"])),
+    "bar": ("pltBar", lambda m: m.main(["-i", runPrefix()])),
+}
+
+# extensions of the figures the families write
+figureExt = (".png", ".pdf", ".svg", ".eps", ".jpg")
+
+# the imported modules and the matplotlib parameters they set, by family
+modules = {}
+familyRc = {}
+
+
+def runPrefix() -> str:
+    """Prefix of the files of the run in the current directory (as pltBar
+    takes it).
+    """
+    fileName = getFiles("*_ret_rel_t.xlsx")
+    if not fileName:
+        raise Exception("*_ret_rel_t.xlsx not found")
+    return fileName[:-len("_ret_rel_t.xlsx")]
+
+
+def rcSnapshot() -> dict:
+    """Current matplotlib parameters (without the backend).
+    """
+    return {k: v for k, v in mpl.rcParams.items() if k != "backend"}
+
+
+def loadFamilies() -> None:
+    """Import the plot modules once. Each module sets some matplotlib
+    parameters when it is imported, these are kept per family and only
+    applied while the family renders, so the families do not change each
+    other's figures.
+    """
+    if modules:
+        return
+    base = rcSnapshot()
+    for name, (module, func) in families.items():
+        modules[name] = importlib.import_module(module)
+        familyRc[name] = rcSnapshot()
+        mpl.rcParams.update(base)
+
+
+def imageFiles() -> dict:
+    """Modification time of the figures in the current directory, by name.
+    """
+    return {f: os.path.getmtime(f) for f in os.listdir(".")
+            if f.endswith(figureExt) and os.path.isfile(f)}
+
+
+def renderRun(runDir: str, outDir: str, names: list) -> list:
+    """Render the plot families `names` of the run in `runDir` and move the
+    figures to `outDir` (the figures are saved in the run directory first, a
+    run can only be rendered by one job at a time). Returns a row (run, plot,
+    seconds, figures, status) for every family, a failing family does not
+    stop the others. The figures a failing family wrote before the error are
+    moved as well.
+    """
+    import matplotlib.pyplot as plt
+    loadFamilies()
+    os.makedirs(outDir, exist_ok=True)
+    cwd = os.getcwd()
+    rows = []
+    os.chdir(runDir)
+    try:
+        for name in names:
+            t0 = time.perf_counter()
+            before = imageFiles()
+            files = []
+            status = "ok"
+            try:
+                with mpl.rc_context(familyRc[name]):
+                    files = families[name][1](modules[name])
+            except Exception as e:
+                status = "error: {}".format(e)
+                files = [f for f, t in imageFiles().items()
+                         if before.get(f) != t]
+            finally:
+                plt.close("all")
+            for fname in files:
+                shutil.move(fname, os.path.join(outDir,
+                                                os.path.basename(fname)))
+            rows.append([runDir, name, time.perf_counter() - t0, len(files),
+                         status])
+    finally:
+        os.chdir(cwd)
+        clearWorkbooks(runDir)
+        invalidateFiles(runDir)
+    return rows
+
+
+def outFolders(runs: list, outDir: str) -> list:
+    """Output folder of every run, named after the run directory (with a
+    suffix if two runs have the same name).
+    """
+    folders = []
+    for run in runs:
+        name = os.path.basename(os.path.normpath(run))
+        folder = os.path.join(outDir, name)
+        n = 2
+        while folder in folders:
+            folder = os.path.join(outDir, "{}_{}".format(name, n))
+            n += 1
+        folders.append(folder)
+    return folders
+
+
+def main(argv) -> pd.DataFrame:
+    """Generate the plots of the run directories given as arguments.
+    Optional arguments: `-o` the output folder (default plots), `-p` a comma
+    separated list of families (bars, em, pertech, bar; default all), `-j N`
+    to render N runs at the same time and `-r fast` to use mathtext instead
+    of LaTeX. The timings are written to timings.csv in the output folder.
+    """
+    usage = "pltBatch.py -o <outfolder> -p <plot,plot> -j <jobs> " \
+        "-r <tex|fast> <rundir> [<rundir> ...]"
+    outDir = "plots"
+    names = list(families)
+    jobs = 1
+    try:
+        opts, args = getopt.getopt(argv, "ho:p:j:r:",
+                                   ["outdir=", "plots=", "jobs=", "render="])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == "-h":
+            print(usage)
+            sys.exit()
+        elif opt in ("-o", "--outdir"):
+            outDir = arg
+        elif opt in ("-p", "--plots"):
+            names = arg.split(",")
+        elif opt in ("-j", "--jobs"):
+            jobs = int(arg)
+        elif opt in ("-r", "--render"):
+            setRenderProfile(arg, serif=False) #: before the imports
+            os.environ["STRE3AM_PLOT_PROFILE"] = arg #: for the workers
+    if len(args) == 0:
+        print(usage)
+        sys.exit(2)
+    for name in names:
+        if name not in families:
+            raise Exception("unknown plot {}".format(name))
+    runs = [os.path.abspath(run) for run in args]
+    if len(set(runs)) < len(runs):
+        raise Exception("a run directory is given more than once")
+    mpl.use("Agg")
+    loadFamilies()
+    outDir = os.path.abspath(outDir)
+    runJobs = [(renderRun, (run, folder, names))
+               for run, folder in zip(runs, outFolders(runs, outDir))]
+    t0 = time.perf_counter()
+    if jobs > 1:
+        results = renderParallel(runJobs, processes=jobs,
+                                 initializer=loadFamilies)
+    else:
+        results = [func(*fargs) for func, fargs in runJobs]
+    timings = pd.DataFrame([row for rows in results for row in rows],
+                           columns=["run", "plot", "seconds", "figures",
+                                    "status"])
+    os.makedirs(outDir, exist_ok=True)
+    timings.to_csv(os.path.join(outDir, "timings.csv"), index=False)
+    print(timings.groupby("plot")[["seconds", "figures"]].sum())
+    print("{} runs in {:.1f} s".format(len(args), time.perf_counter() - t0))
+    return timings
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -53,6 +53,7 @@ from matplotlib.colors import Normalize as nrm
 from matplotlib.cm import ScalarMappable as smb
 from matplotlib.colors import ListedColormap
 from generalD import *
+from readExcelResults import loadEmissions
 
 
 __author__ = "David Thierry"
@@ -60,41 +61,23 @@ __author__ = "David Thierry"
 plt.rcParams['hatch.linewidth'] = 0.2
 colour_map = "tab20c"
 
-plt.rcParams['text.usetex'] = True
+setRenderProfile(serif=False) #: LaTeX or the fast profile
 
 
 def all_em():
     """Plot the aggregate emissions of the system. Based on the xlsx run.
-    File is called em_all_{}.png
+    File is called em_all_{}.png, returns the list of files.
     """
-    lenFuelBased = 0
-    name1 = []
-    for name in namesW:
-        kind = kinds[name]
-        for i in range(I):
-            if not fuelKind[i]:
-                continue
-            for k in range(kind[i]):
-                if name == "w":
-                    sheet0 = name + "e_" + str(i)
-                    lenFuelBased += 1
-                else:
-                    sheet0 = name + "e_" + str(i) + "_" + str(k)
-                name1.append(sheet0)
+    em = loadEmissions()
+    name1 = em["sheets"]
+    lenFuelBased = len([name for name in name1 if name.startswith("we_")])
 
     print(name1)
     print("Number of techs {}".format(lenFuelBased))
 
     norm = nrm(vmin=0, vmax=lenFuelBased)
-    df = pd.DataFrame()
     em_file = getFiles("*_em.xlsx")
-    print("Using file {}".format(em_file))
-    for name in name1:
-        d = pd.read_excel(em_file, sheet_name=name, index_col=0)
-        if name == name1[0]:
-            df = pd.DataFrame(d.sum(axis=1), columns=[name])
-        else:
-            df.insert(1, name, d.sum(axis=1))
+    df = pd.DataFrame(em["sheet"], index=em["time"], columns=name1)
     #
     n = nrm(vmin=1, vmax=11)
     cmap = plt.get_cmap("tab10")
@@ -109,29 +92,32 @@ def all_em():
             "xe": "++"
             }
     d = df
-    df0 = pd.Series([0 for i in df.index])
+    colours, labels, hatches = [], [], []
     for c in name1:
         realName = tName[int(c.split("_")[1])]
         colour = cmap(
                 norm(int(c.split("_")[1]))
                 )
         print(c, c.split("_")[1], n(int(c.split("_")[1])+1), colour)
-        bC = a.bar(d.index + 2015 + 1, d[c],
-                bottom=df0,
-                label=(cute_names[c.split("_")[0]] + " " + realName),
-                color=colour,
-                alpha=0.5,
-                hatch=h[c.split("_")[0]],
-                linewidth=0.1,
-                )
-        df0 += d[c]
+        colours.append(colour)
+        labels.append(cute_names[c.split("_")[0]] + " " + realName)
+        hatches.append(h[c.split("_")[0]])
+    bC, df0 = stackedBars(a, d.index + 2015 + 1, d[name1],
+                          colors=colours,
+                          labels=labels,
+                          alpha=0.5,
+                          hatches=hatches,
+                          linewidth=0.1,
+                          )
     a.set_xlabel("year")
     l = a.legend(bbox_to_anchor=(1.0, 1.1))
     a.set_ylabel(r"tCO$_{2}$")
     a.set_title("Emission")
     efn = em_file.split(".")[1].replace("/", "")
-    f.savefig("em_all_{}.png".format(efn), format="png", bbox_inches="tight")
+    fname = "em_all_{}.png".format(efn)
+    f.savefig(fname, format="png", bbox_inches="tight")
     print("saved!")
+    return [fname]
 
 
 if __name__ == "__main__":
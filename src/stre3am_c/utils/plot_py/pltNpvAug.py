@@ -48,74 +48,74 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
+from typing import Tuple
 from generalD import *
-import os, fnmatch
+import os, sys
 
-plt.rcParams.update({ #: set the font
-    "text.usetex": True,
-    "font.family": "serif",
-    "font.serif": ["Palatino"],
-})
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "../coalesce_py/"))
+from coalesce import read_columnar, PARQUET_OUT, XLSX_OUT
+
+setRenderProfile() #: LaTeX or the fast profile, and the font
 
 
 __author__ = "David Thierry"
 
-def whichRetrofit(series) -> bool:
-    """Returns a list of booleans based on the tags.
+# sheets of coalesce.xlsx with the cost components and the emissions
+costSheets = ["cap_cost_retro", # 0
+              "cap_cost_new", # 1
+              "old_VoNm", # 2
+              "retro_VoNm", # 3
+              "new_VoNm", # 4
+              "old_FoNm", # 5
+              "retro_FoNm", # 6
+              "new_FoNm", # 7
+              "old_RetCost", # 8
+              "retro_RetCost", # 9
+              "new_RetCost", # 10
+              "old_fuel", # 11
+              "retro_fuel", # 12
+              "new_fuel" # 13
+              ]
+co2Sheets = ["old_co2", "retro_co2", "new_co2"]
+
+
+def whichRetrofit(series) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Returns boolean arrays based on the tags of the index of `series`.
     E.g., if tag has RF then RF label = True, etc.
     """
-    resRfList = []
-    resClList = []
-    resBaList = []
-    for i in series.index:
-        rRf = False
-        rCl = False
-        rBa = False
-        l = i.split("_")
-        while len(l) != 0:
-            label_ = l.pop()
-            if label_ == "RF":
-                rRf = True
-            elif label_ == "CLT":
-                rCl = True
-            elif label_ == "BAU":
-                rBa = True
-        resRfList.append(rRf)
-        resClList.append(rCl)
-        resBaList.append(rBa)
-    return resRfList, resClList, resBaList
+    tags = pd.Index(series.index).astype(str)
+    resRf = np.asarray(tags.str.contains(r"(?:^|_)RF(?:_|$)"), dtype=bool)
+    resCl = np.asarray(tags.str.contains(r"(?:^|_)CLT(?:_|$)"), dtype=bool)
+    resBa = np.asarray(tags.str.contains(r"(?:^|_)BAU(?:_|$)"), dtype=bool)
+    return resRf, resCl, resBa
+
 
-def getFiles(pattern, path="."):
-    """Same function as in generalD. Finds the whole path of the required file.
+def loadCostBreakdown(sheets: list=costSheets + co2Sheets) -> pd.DataFrame:
+    """Scenario x component matrix with the totals (the last row) of the
+    `sheets` of the coalesced results, read in a single pass. Uses the
+    coalesce.parquet data set if there is one, coalesce.xlsx otherwise.
     """
-    result = []
-    for root, dirs, files in os.walk(path):
-        for name in files:
-            if fnmatch.fnmatch(name, pattern):
-                result.append(os.path.join(root, name))
-                print("Using file {}".format(os.path.join(root, name)))
-                return os.path.join(root, name)
-    return None
+    if os.path.isdir(PARQUET_OUT):
+        d = read_columnar(PARQUET_OUT, sheets=sheets,
+                          columns=["sheet", "row", "case", "value"])
+        d = d[d["row"] == d.groupby("sheet")["row"].transform("max")]
+        m = d.pivot(index="case", columns="sheet", values="value")
+        return m.reindex(index=pd.unique(d["case"]), columns=list(sheets))
+    file = getFiles(XLSX_OUT, path=".")
+    if not file:
+        raise Exception(XLSX_OUT + " not found")
+    dfs = readExcel(file, sheet_name=list(sheets), index_col=0)
+    m = pd.DataFrame({sh: dfs[sh].drop(0, axis=1).iloc[-1] for sh in sheets})
+    return m.astype(float)
 
 
 def plot_npv_bars():
     """Generate the NPV plots (with CO2) for the electricity
     generation problem
     """
-    file = getFiles("coalesce.xlsx", path=".")
-    eFile = pd.ExcelFile(file)
-    df1 = eFile.parse(sheet_name="old_co2", index_col=0)
-    df2 = eFile.parse(sheet_name="retro_co2", index_col=0)
-    df3 = eFile.parse(sheet_name="new_co2", index_col=0)
-
-    df1.drop(0, axis=1, inplace=True)#
-    df2.drop(0, axis=1, inplace=True)#
-    df3.drop(0, axis=1, inplace=True)#
-
-    o_co2 = df1.tail(1).iloc[0, :]
-    r_co2 = df2.tail(1).iloc[0, :]
-    n_co2 = df3.tail(1).iloc[0, :]
-    total_co2 = o_co2 + r_co2 + n_co2
+    m = loadCostBreakdown()
+    total_co2 = m[co2Sheets].sum(axis=1, skipna=False)
     clrl = ["tomato", #"#15D666", 0
             "#15D6C7", # 1
             "#1585D6", # 2
@@ -152,21 +152,6 @@ def plot_npv_bars():
                '..', # 14
                '***' # 15
                ]
-    cost_sheets = ["cap_cost_retro", # 0
-                   "cap_cost_new", # 1
-                   "old_VoNm", # 2
-                   "retro_VoNm", # 3
-                   "new_VoNm", # 4
-                   "old_FoNm", # 5
-                   "retro_FoNm", # 6
-                   "new_FoNm", # 7
-                   "old_RetCost", # 8
-                   "retro_RetCost", # 9
-                   "new_RetCost", # 10
-                   "old_fuel", # 11
-                   "retro_fuel", # 12
-                   "new_fuel" # 13]
-                   ]
     labels = [
         "Cap. cost retro.", #0
         "Cap. cost new", #1
@@ -183,6 +168,7 @@ def plot_npv_bars():
         "Retro. Fuel c.", #12 ##
         "New Fuel c." #13
     ]
+    labels = [texLabel(label) for label in labels]
 
     row = [11, #0 ##
            15, #1
@@ -199,39 +185,21 @@ def plot_npv_bars():
            11, #12 ##
            10 #13
            ]
-    file = getFiles("coalesce.xlsx", path=".")
-    eFile = pd.ExcelFile(file)
-    i = 0
-    x_pos = np.arange(2)
     f, a = plt.subplots(dpi=200)
     #a.grid(visible=True, which="major", axis="y")
-    for cs in cost_sheets:
-        df = eFile.parse(sheet_name=cs, index_col=0)
-        #s = df.iloc[row[i], 1:]
-        df.drop(0, axis=1, inplace=True)
-        s = df.tail(1).iloc[0, :]
-        lendf = s.shape[0]
-        if i == 0:
-            s0 = pd.Series(np.zeros(lendf))
-        #print(i, cs, row[i])
-        print(s)
-        print(s0)
-        x_pos = np.arange(lendf)
-        print(x_pos)
-        b = a.bar(x_pos,
-                  s,
-                  align="center",
-                  bottom=s0,
-                  label=labels[i],
-                  color=clrl[i],
-                  hatch=hatches[i])
-        if i == 0:
-            s0 = s.copy()
-        else:
-            s0 = s0.add(s)
-        i += 1
-    whichRf, whichCl, whichBa = whichRetrofit(s)
-    b = a.bar(x_pos, s0, align="center", color="none")
+    x_pos = np.arange(m.shape[0])
+    print(m[costSheets])
+    bC, s0 = stackedBars(a, x_pos, m[costSheets],
+                         align="center",
+                         labels=labels,
+                         colors=clrl[:len(costSheets)],
+                         hatches=hatches[:len(costSheets)])
+    whichRf, whichCl, whichBa = whichRetrofit(m)
+    # outline of the totals, by tag
+    edges = np.where(whichRf, np.where(whichCl, "r", "k"), "none")
+    b = a.bar(x_pos, s0, align="center", color="none",
+              edgecolor=list(edges),
+              hatch=["/" if ba else None for ba in whichBa])
     print("emissions")
     print(total_co2)
     ax2 = a.twinx()
@@ -242,22 +210,11 @@ def plot_npv_bars():
     ax2.set_ylim((0, max(total_co2)*1.05))
     ax2.legend(loc=0)
 
-    for i in range(len(b)):
-        if whichRf[i]:
-            b[i].set_lw(1)
-            color = "r" if whichCl[i] else "k"
-            b[i].set_edgecolor(color)
-        if whichBa[i]:
-            b[i].set_hatch("/")
-
-    ticks = a.set_xticks(x_pos, labels=s.index, rotation=90)
-    for i in range(len(ticks)):
-        if whichRf[i]:
-            color = "r" if whichCl[i] else "k"
-            ticks[i].get_children()[3].set_color(color)
-            # print(ticks[i].get_children())
+    ticks = a.set_xticks(x_pos, labels=m.index, rotation=90)
+    for i in np.flatnonzero(whichRf):
+        ticks[i].label1.set_color(edges[i])
     a.set_ylabel("Millions \$")
-    a.set_title("Overall costs \& CO2 emission")
+    a.set_title(texLabel("Overall costs \& CO2 emission"))
     a.bar_label(b, padding=-50, fmt="%.2E", rotation=90)
     f.savefig("npvAndco.png", bbox_inches="tight")
     # save the legend
@@ -52,20 +52,152 @@ from matplotlib.colors import Normalize as nrm
 from matplotlib.cm import ScalarMappable as smb
 from matplotlib.colors import ListedColormap
 from generalD import *
+import sys, getopt
 
 # the list names comes from generalID
 
 __author__ = "David Thierry"
 plt.rcParams['hatch.linewidth'] = 0.2
 
+
+class WorkbookSession:
+    """Sheets of the _effective.xlsx file shared by all the plots, each sheet
+    is loaded (and cleaned) only once.
+    """
+    def __init__(self, excelFileName: str=None):
+        if excelFileName is None:
+            excelFileName = getFiles("*_effective.xlsx")
+        self.excelFileName = excelFileName
+        self.sheets = {}
+
+    def sheet(self, name: str) -> pd.DataFrame:
+        """Return the (time x age) sheet `name`.
+        """
+        if name not in self.sheets:
+            d = readExcel(self.excelFileName, sheet_name=name, index_col=0)
+            self.sheets[name] = d.drop(columns="Unnamed: 1")
+        return self.sheets[name]
+
+    def preload(self) -> None:
+        """Load all the (time x age) sheets, e.g. before sending the session
+        to other processes.
+        """
+        for name in names:
+            kind = kinds[name]
+            for i in range(I):
+                for k in range(kind[i]):
+                    if name in ["w", "uw"]:
+                        self.sheet(name + "_" + str(i))
+                    else:
+                        self.sheet(name + "_" + str(i) + "_" + str(k))
+
+
+class FigureTemplate:
+    """Figure, axes and colorbars of a per-tech plot, built once and reused
+    for every tech with the same layout. The bars of the previous tech are
+    removed and the colorbars take the norms of the new one.
+    """
+    def __init__(self, cmaps: list, dpi: int=50):
+        self.f, self.a = plt.subplots(dpi=dpi)
+        self.cbs = [self.f.colorbar(smb(norm=nrm(vmin=0, vmax=1), cmap=cmap),
+                                    ax=self.a, fraction=0.05)
+                    for cmap in cmaps]
+
+    def reset(self, norms: list) -> tuple:
+        """Clear the data of the axes and set the norms of the colorbars,
+        returns the figure, the axes and the colorbars.
+        """
+        a = self.a
+        for artist in a.collections + a.patches + a.lines:
+            artist.remove()
+        a.containers.clear()
+        a.relim()
+        a.autoscale(True)
+        for cb, n in zip(self.cbs, norms):
+            cb.mappable.set_norm(n) # redraws the colorbar
+            # the mappable reports alpha=1, keep the alpha of the cmap
+            cb.solids.set_alpha(None)
+        return self.f, a, self.cbs
+
+
+# figure templates of this process by layout, None if they are not used
+templates = None
+
+
+def useTemplates(on: bool=True) -> None:
+    """Reuse the figures across techs (see FigureTemplate), or build a new
+    figure for every tech.
+    """
+    global templates
+    templates = {} if on else None
+
+
+def newFigure(layout: tuple, cmaps: list, norms: list) -> tuple:
+    """Figure, axes and colorbars (one per cmap) of a per-tech plot, from
+    the template of the layout in template mode.
+    """
+    if templates is None:
+        f, a = plt.subplots(dpi=50)
+        cbs = [f.colorbar(smb(norm=n, cmap=cmap), ax=a, fraction=0.05)
+               for cmap, n in zip(cmaps, norms)]
+        return f, a, cbs
+    if layout not in templates:
+        templates[layout] = FigureTemplate(cmaps)
+    return templates[layout].reset(norms)
+
+
+def closeFigure(f) -> None:
+    """Close a per-tech figure, unless it belongs to a template.
+    """
+    if templates is None:
+        plt.close(f)
+
+
+# session of a rendering process (see renderTech)
+workerSession = None
+
+
+def initWorker(session: WorkbookSession, kindsIdx: dict,
+               template: bool=False) -> None:
+    """Give a rendering process the session and kinds loaded by the parent.
+    """
+    global workerSession
+    workerSession = session
+    setKinds(kindsIdx)
+    useTemplates(template)
+
+
+def renderTech(plot: str, tech: int, kindStr: str=None) -> list:
+    """Render a single per-tech figure with the session of this process.
+    """
+    if plot == "singleBars":
+        return singleBars(tech, kindStr, workerSession)
+    elif plot == "wAndXandZbars":
+        return wAndXandZbars(tech, workerSession)
+    return wAndZbars(tech, workerSession)
+
+
+def techJobs() -> list:
+    """All the per-tech figures, as (plot, tech, kind) tuples.
+    """
+    jobs = [("singleBars", i, "w") for i in range(I)]
+    jobs += [("singleBars", i, "x") for i in range(3)]
+    jobs += [("singleBars", i, "z") for i in range(3)]
+    jobs += [("wAndXandZbars", i) for i in range(I)]
+    jobs += [("wAndZbars", i) for i in range(I)]
+    return jobs
+
+
 # number 1
-def singleBars(tech: int, kindStr: str):
+def singleBars(tech: int, kindStr: str, session: WorkbookSession=None):
     """ Generates the plots for the capacities individually for each
     technology and kind, e.g. w_1, w_2, ..., z_1_1, z_1_2, ..., etc.
-    Output files are named bars_{}_{}_{}.png
+    Output files are named bars_{}_{}_{}.png, returns the list of files.
     """
 
-    excelFileName = getFiles("*_effective.xlsx")
+    if session is None:
+        session = WorkbookSession()
+    excelFileName = session.excelFileName
     if kindStr not in namesW:
         raise Exception("kindStr has to be w, z, or x")
     realName = tName[tech]
@@ -81,53 +213,58 @@ def singleBars(tech: int, kindStr: str):
     dfs = {}
     #print(nameK)
     for name in nameK:
-        d = pd.read_excel(excelFileName, sheet_name=name, index_col=0)
-        d = d.drop(columns="Unnamed: 1")
+        d = session.sheet(name)
         dfs[name] = d
     if len(nameK) == 0:
         print("Empty kind")
-        return
-    f, a = plt.subplots(dpi=50)
-    df0 = pd.Series([0 for i in d.index])
+        return []
     cmap = plt.get_cmap(CMAP0)
-    dfu = pd.Series([0 for i in d.index])
-
     kind = kinds[kindStr]
-    yu = 1
-    yl = -1
+    norms = []
     for k in range(kind[tech]):
         if kindStr == "w":
             name = kindStr + "_" + str(tech)
         else:
             name = kindStr + "_" + str(tech) + "_" + str(k)
-        d = dfs[name]
         # create cmap nrm
-        list_of_columns = d.columns
+        list_of_columns = dfs[name].columns
         for i in list_of_columns:
             print(i.split("="))
         # if kindStr == "z":
         #    list_of_columns = [c.replace("-", "=") for c in d.columns]
         l = [int(c.split("=")[1]) for c in list_of_columns]
-        n = nrm(vmin=min(l), vmax=max(l))
+        norms.append(nrm(vmin=min(l), vmax=max(l)))
+    f, a, cbs = newFigure(("singleBars", len(norms)), [cmap]*len(norms),
+                          norms)
+    df0 = pd.Series([0 for i in d.index])
+    dfu = pd.Series([0 for i in d.index])
+
+    yu = 1
+    yl = -1
+    for k in range(kind[tech]):
+        if kindStr == "w":
+            name = kindStr + "_" + str(tech)
+        else:
+            name = kindStr + "_" + str(tech) + "_" + str(k)
+        d = dfs[name]
+        n = norms[k]
+        colours = []
         for c in d.columns:
             if kindStr == "z":
                 c_val = c.replace("-", "=")
             else:
                 c_val = c
-            colour = cmap(n(int(c_val.split("=")[1])))
-            bC = a.bar(d.index + 2016, d[c],
-                    bottom=df0,
-                    #label=c,
-                    color=colour,
-                    # alpha=0.1,
-                    linewidth=0.3,
-                    edgecolor="k")
-            df0 += d[c]
+            colours.append(cmap(n(int(c_val.split("=")[1]))))
+        bC, df0 = stackedBars(a, d.index + 2016, d,
+                              bottom=df0,
+                              colors=colours,
+                              # alpha=0.1,
+                              linewidth=0.3,
+                              edgecolor="k")
         yu = max(yu, df0.max())
         #a.legend(loc=0, ncol=2)
-        cb = f.colorbar(smb(norm=n, cmap=cmap), ax=a, fraction=0.05)
         cbar_label = "Age"
-        cb.set_label(cbar_label)
+        cbs[k].set_label(cbar_label)
 
 
         # decomission
@@ -138,18 +275,18 @@ def singleBars(tech: int, kindStr: str):
 
         d = dfs[name]
         d = d.mul(-1)
+        colours = []
         for c in d.columns:
             if kindStr == "z":
                 c_val = c.replace("-", "=")
             else:
                 c_val = c
-            colour = cmap(n(int(c_val.split("=")[1])))
-            a.bar(d.index + 2015, d[c],
-                    bottom=dfu,
-                    color=colour,
-                    #edgecolor="k", lw=0.3
-                    )
-            dfu += d[c]
+            colours.append(cmap(n(int(c_val.split("=")[1]))))
+        bC, dfu = stackedBars(a, d.index + 2015, d,
+                              bottom=dfu,
+                              colors=colours,
+                              #edgecolor="k", lw=0.3
+                              )
         yl = min(yl, dfu.min())
     yl = round(int(yl*1.01), -3)
     print(yu)
@@ -169,17 +306,19 @@ def singleBars(tech: int, kindStr: str):
     a.set_title(realName)
     ##
     efn = excelFileName.split(".")[1].replace("/", "")
-    f.savefig("bars_{}_{}_{}.png".format(tech, kindStr, efn),
-            format="png")
-    plt.close(f)
+    fname = "bars_{}_{}_{}.png".format(tech, kindStr, efn)
+    f.savefig(fname, format="png")
+    closeFigure(f)
     print("saved!")
-    return d
+    return [fname]
 
 # number 2
-def wAndXandZbars(tech: int):
+def wAndXandZbars(tech: int, session: WorkbookSession=None):
     """ This one plots the distribution of ages for existing and new.
     It also plots retrofits, but it only uses a single colour"""
-    excelFileName = getFiles("*_effective.xlsx")
+    if session is None:
+        session = WorkbookSession()
+    excelFileName = session.excelFileName
     realName = tName[tech]
     #name0 = [name + "_" + str(tech) for name in names]
     name0 = []
@@ -204,15 +343,12 @@ def wAndXandZbars(tech: int):
     doesItHaveZ = True if len(name1) == 3 else False
     dfs = {}
     for name in name1:
-        d = pd.read_excel(excelFileName, sheet_name=name, index_col=0)
-        d = d.drop(columns="Unnamed: 1")
+        d = session.sheet(name)
         dfs[name] = d
         if doesItHaveZ:
             if name == name[1]:
                 dfs[name] = pd.DataFrame(d.sum(axis=1)) # retrofit is sum
     #
-    f, a = plt.subplots(dpi=50)
-
     cmap = plt.get_cmap("tab20c")
     # create the alphaed cmap
     my_cmap = cmap(np.arange(cmap.N))
@@ -224,56 +360,49 @@ def wAndXandZbars(tech: int):
     d = dfs[name1[2]] if doesItHaveZ else dfs[name1[1]]
     lx = [int(c.split("=")[1]) for c in d.columns]
     nx = nrm(vmin=min(lx), vmax=max(lx))
+    f, a, (cbw, cbx) = newFigure(("wAndXandZbars",), [cmap, my_cmap],
+                                 [n, nx])
     yuw = 1e3
     yux = 1e3
     yuz = 1e3
     yu = 1e3
-    df0 = pd.Series([0 for i in d.index])
+    df0 = 0e0
     # w
     d = dfs[name1[0]]
-    for c in d.columns:
-        colour = cmap(n(int(c.split("=")[1])))
-        bC = a.bar(d.index+2015+1, d[c],
-                bottom=df0,
-                #label="w",
-                color=colour,
-                alpha=1,
-                linewidth=0.1,
-                edgecolor="black")
-        df0 += d[c]
-        yu = max(yu, df0.max())
+    colours = [cmap(n(int(c.split("=")[1]))) for c in d.columns]
+    bC, df0 = stackedBars(a, d.index + 2015 + 1, d,
+                          bottom=df0,
+                          colors=colours,
+                          #labels=["w"]*len(d.columns),
+                          alpha=1,
+                          linewidth=0.1,
+                          edgecolor="black")
+    yu = max(yu, df0.max())
     # z (with a single colour)
     # d = dfs[name1[1]].shift(fill_value=0)
     if doesItHaveZ:
         d = dfs[name1[1]]
-        for c in d.columns:
-            colour = "ghostwhite"
-            bC= a.bar(d.index+2015+1, d[c],
-                    bottom=df0,
-                    label="z",
-                    color=colour,
-                    linewidth=0.8,
-                    #alpha=0.5,
-                    hatch="\\",
-                    edgecolor="black")
-            df0 += d[c]
-            yu = max(yu, df0.max())
+        bC, df0 = stackedBars(a, d.index + 2015 + 1, d,
+                              bottom=df0,
+                              colors=["ghostwhite"]*len(d.columns),
+                              labels=["z"]*len(d.columns),
+                              hatches=["\\"]*len(d.columns),
+                              linewidth=0.8,
+                              #alpha=0.5,
+                              edgecolor="black")
+        yu = max(yu, df0.max())
     # x
     d = dfs[name1[2]] if doesItHaveZ else dfs[name1[1]]
-    for c in d.columns:
-        colour = my_cmap(nx(int(c.split("=")[1])))
-        bC = a.bar(d.index+2015+1, d[c],
-                bottom=df0,
-                #label=c,
-                color=colour,
-                linewidth=0.1,
-                edgecolor="k",
-                hatch=3*"o")
-        df0 += d[c]
-        yu = max(yu, df0.max())
+    colours = [my_cmap(nx(int(c.split("=")[1]))) for c in d.columns]
+    bC, df0 = stackedBars(a, d.index + 2015 + 1, d,
+                          bottom=df0,
+                          colors=colours,
+                          #labels=list(d.columns),
+                          hatches=[3*"o"]*len(d.columns),
+                          linewidth=0.1,
+                          edgecolor="k")
+    yu = max(yu, df0.max())
     #a.legend(loc=0, ncol=2)
-    cbw = f.colorbar(smb(norm=n, cmap=cmap), ax=a, fraction=0.05)
-    cbx = f.colorbar(smb(norm=nx, cmap=my_cmap), ax=a, fraction=0.05)
     #cbw.set_label("existing")
     #cbw.set_ticks([0, 25])
     #cbx.set_label("new")
@@ -288,15 +417,19 @@ def wAndXandZbars(tech: int):
 
     a.set_title(realName)
     efn = excelFileName.split(".")[1].replace("/", "")
-    f.savefig("wAndzAndx_{}_{}.png".format(tech, efn), format="png")
-    plt.close(f)
+    fname = "wAndzAndx_{}_{}.png".format(tech, efn)
+    f.savefig(fname, format="png")
+    closeFigure(f)
     print("saved!")
+    return [fname]
 
 # number 3
-def wAndZbars(tech: int):
+def wAndZbars(tech: int, session: WorkbookSession=None):
     """This one plots only existing + retrofits with age distribution with
     colours. Though, typically retrofits are very skewed to the end."""
-    excelFileName = getFiles("*_effective.xlsx")
+    if session is None:
+        session = WorkbookSession()
+    excelFileName = session.excelFileName
     realName = tName[tech]
     name1 = []
     for name in namesW:
@@ -310,71 +443,91 @@ def wAndZbars(tech: int):
 
     dfs = {}
     for name in name1:
-        d = pd.read_excel(excelFileName, sheet_name=name, index_col=0)
-        d = d.drop(columns="Unnamed: 1")
+        d = session.sheet(name)
         dfs[name] = d
 
-    f, a = plt.subplots(dpi=50)
     cmap = plt.get_cmap("tab20c")
 
     l = [int(c.split("=")[1]) for c in dfs[name1[0]].columns]
     n = nrm(vmin=min(l), vmax=max(l))
     nz = n
+    f, a, (cbw,) = newFigure(("wAndZbars",), [cmap], [n])
 
     yu = 1e3
-    df0 = pd.Series([0 for i in d.index])
+    df0 = 0e0
     # w
     d = dfs[name1[0]]
-    for c in d.columns:
-        colour = cmap(n(int(c.split("=")[1])))
-        bC = a.bar(d.index, d[c],
-                bottom=df0,
-                # label="w",
-                color=colour,
-                linewidth=0.1,
-                edgecolor="k")
-        df0 += d[c]
+    colours = [cmap(n(int(c.split("=")[1]))) for c in d.columns]
+    bC, df0 = stackedBars(a, d.index, d,
+                          bottom=df0,
+                          colors=colours,
+                          # labels=["w"]*len(d.columns),
+                          linewidth=0.1,
+                          edgecolor="k")
 
     # z
     d = dfs[name1[1]]
     d = d.shift(fill_value=0)
-    k = 0
+    colours = []
     for c in d.columns:
         zstr = c.replace("-", "=")
         zn = int(zstr.split("=")[1])
         print(zstr, zn)
-        colour = cmap(nz(zn))
-        bC = a.bar(d.index, d[c],
-                bottom=df0,
-                color=colour)
-        df0 += d[c]
-        k += 1
+        colours.append(cmap(nz(zn)))
+    bC, df0 = stackedBars(a, d.index, d,
+                          bottom=df0,
+                          colors=colours)
     yu = max(yu, df0.max())
     yu = round(int(yu*1.01), -3)
     #a.legend(loc=0, ncol=2)
     #a.set_ylim(top=yu)
-    cbw = f.colorbar(smb(norm=n, cmap=cmap), ax=a, fraction=0.05)
     # cbz = f.colorbar(smb(norm=nz, cmap=cmap), ax=a, fraction=0.05)
     cbw.set_label("existing")
     cbw.set_ticks([0, 25])
     a.set_xlabel("year")
     a.set_ylabel("GWh")
     a.set_title(realName)
-    f.savefig("wAndz_{}.png".format(tech), format="png")
-    plt.close(f)
+    fname = "wAndz_{}.png".format(tech)
+    f.savefig(fname, format="png")
+    closeFigure(f)
     print("saved!")
+    return [fname]
 
 
 
-if __name__ == "__main__":
-    for i in range(I):
-        singleBars(i, "w")
-    for i in range(3):
-        singleBars(i, "x")
-    for i in range(3):
-        singleBars(i, "z")
-    for i in range(I):
-        wAndXandZbars(i)
-    for i in range(I):
-        wAndZbars(i)
+def main(argv):
+    """Generate all the per-tech figures. Optional command line arguments:
+    `-j N` (or `--jobs N`) to render the figures with N processes, `-t` (or
+    `--template`) to reuse the figures across techs.
+    """
+    jobs = 1
+    template = False
+    try:
+        opts, args = getopt.getopt(argv, "hj:t", ["jobs=", "template"])
+    except getopt.GetoptError:
+        print("pltPerTech.py -j <jobs> -t")
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == "-h":
+            print("pltPerTech.py -j <jobs> -t")
+            sys.exit()
+        elif opt in ("-j", "--jobs"):
+            jobs = int(arg)
+        elif opt in ("-t", "--template"):
+            template = True
+    session = WorkbookSession()
+    if jobs > 1:
+        session.preload()
+        files = renderParallel([(renderTech, j) for j in techJobs()],
+                               processes=jobs, initializer=initWorker,
+                               initargs=(session, dict(kindsIndex), template))
+    else:
+        initWorker(session, {}, template)
+        files = [renderTech(*j) for j in techJobs()]
+    files = [fname for fnames in files for fname in fnames]
+    print("{} figures".format(len(files)))
+    return files
 
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
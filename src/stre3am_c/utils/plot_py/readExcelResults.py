@@ -45,51 +45,54 @@
 #80#############################################################################
 
 import sys
+import numpy as np
 import pandas as pd
 from typing import Tuple
 from generalD import *
 
 __author__ = "David Thierry"
 
-def loadExcelOveralls(shift: bool=False) -> Tuple[dict, float]:
-    """read the aggregates of the _effective.xlsx file, which is generated from
-    the results.
+def overallSheets() -> dict:
+    """Sheet names of the _effective.xlsx file that go into every name, e.g.
+    w_0, w_1, ..., for "w" and z_0_0, z_0_1, ..., for "z".
     """
-    excelFileName = getFiles("*_effective.xlsx")
-    if not excelFileName:
-        raise Exception("not found")
-    ef = pd.ExcelFile(excelFileName)
-    #b = pd.DataFrame()  # this doesn't work :S
-    l = {}
+    sheets = {}
     for name in names:
-        count = 0
         kind = kinds[name]
         if max(kind) == 0:
             continue
+        sheets[name] = []
         for i in range(I):
-            print(name, kind)
-            r = range(kind[i])
-            for k in r:
+            for k in range(kind[i]):
                 suffix = "" if name in ["w", "uw"] else "_" + str(k)
                 #: sheet names for w and uw are different
-                sheetName = name + "_" + str(i) + suffix
-                print(sheetName)
-                df = ef.parse(sheet_name=sheetName, index_col=0)
-                df = df.drop(columns="Unnamed: 1") # might delete later
-                series = df.sum(axis=1) # sum over age
-                series.name = sheetName
-                if count == 0:
-                    b = pd.DataFrame(series)
-                else:
-                    d = pd.DataFrame(series)
-                    b = b.join(d)
-                count += 1
-        l[name] = b
+                sheets[name].append(name + "_" + str(i) + suffix)
+    return sheets
+
+
+def loadExcelOveralls(shift: bool=False) -> Tuple[dict, float]:
+    """read the aggregates of the _effective.xlsx file, which is generated from
+    the results. The sums over age come from a single reduction of the
+    tensors of loadTensors.
+    """
+    excelFileName = getFiles("*_effective.xlsx")
+    if not excelFileName:
+        raise Exception("not found")
+    sheets = overallSheets()
+    t, meta = loadTensors()
+    l = {}
+    for name in sheets:
+        print(name, kinds[name])
+        # (tech, kind) of every sheet, in the order of the sheets
+        tk = [(i, k) for i in range(I) for k in range(kinds[name][i])]
+        s = t[name].sum(axis=3) # sum over age
+        s = s[[i for i, k in tk], [k for i, k in tk]]
+        l[name] = pd.DataFrame(s.T, index=meta["time"], columns=sheets[name])
 
-    d = ef.parse(sheet_name="d", index_col=0)
+    d = readExcel(excelFileName, sheet_name="d", index_col=0)
     d.drop(d.tail(1).index, inplace=True)
     l["demand"] = d
-    dmax = d.max()[0]
+    dmax = d.max().iloc[0]
     if shift:
         for name in names:
             if name == "w":
@@ -97,3 +100,96 @@ def loadExcelOveralls(shift: bool=False) -> Tuple[dict, float]:
             l[name] = l[name].shift(fill_value=0) #: shift by one
     return l, dmax
 
+
+def loadTensors() -> Tuple[dict, dict]:
+    """Dense view of the _effective.xlsx file. For every name (w, uw, z, ...)
+    returns an array indexed (tech, kind, time, age), padded with zeros where
+    a tech has fewer kinds or ages (and where the sheets are empty). E.g. the
+    per-tech totals of existing capacity are `t["w"].sum(axis=(1, 3))`.
+    All the sheets are aligned on the union of their time labels. The
+    metadata has the kinds (from _kinds.txt), that time index and the number
+    of ages of every tech.
+    """
+    excelFileName = getFiles("*_effective.xlsx")
+    if not excelFileName:
+        raise Exception("not found")
+    sheets = overallSheets()
+    allSheets = [s for name in sheets for s in sheets[name]]
+    dfs = readExcel(excelFileName, sheet_name=allSheets, index_col=0)
+    frames = {}
+    for name in sheets:
+        kind = kinds[name]
+        for i in range(I):
+            for k in range(kind[i]):
+                suffix = "" if name in ["w", "uw"] else "_" + str(k)
+                df = dfs[name + "_" + str(i) + suffix]
+                frames[(name, i, k)] = df.drop(columns="Unnamed: 1")
+    # the sheets do not all have the same rows, align them on the time labels
+    indexes = [df.index for df in frames.values()]
+    time = indexes[0]
+    for index in indexes[1:]:
+        time = time.union(index)
+    t = {}
+    meta = {"kinds": {}, "time": time.to_numpy(), "ages": {}}
+    for name in sheets:
+        kind = kinds[name]
+        values = {}
+        for i in range(I):
+            for k in range(kind[i]):
+                df = frames[(name, i, k)].reindex(time)
+                values[(i, k)] = np.nan_to_num(df.to_numpy(dtype=float))
+        nA = max(v.shape[1] for v in values.values())
+        a = np.zeros((I, max(kind), len(time), nA))
+        ages = [0 for i in range(I)]
+        for (i, k), v in values.items():
+            a[i, k, :, :v.shape[1]] = v
+            ages[i] = v.shape[1]
+        t[name] = a
+        meta["kinds"][name] = list(kind)
+        meta["ages"][name] = ages
+    return t, meta
+
+
+def emissionSheets() -> list:
+    """Sheet names of the _em.xlsx file of the fuel based techs, i.e. we_0,
+    we_1, ..., ze_0_0, ..., xe_0_0, ...
+    """
+    sheets = []
+    for name in namesW:
+        kind = kinds[name]
+        for i in range(I):
+            if not fuelKind[i]:
+                continue
+            for k in range(kind[i]):
+                if name == "w":
+                    sheets.append(name + "e_" + str(i))
+                else:
+                    sheets.append(name + "e_" + str(i) + "_" + str(k))
+    return sheets
+
+
+def loadEmissions() -> dict:
+    """Emission trajectories from the _em.xlsx file, the sheets are streamed
+    and summed over age as they are read (see streamRowSums). Returns a dict
+    with arrays indexed by time: "sheet" (time x sheets, in the order of
+    "sheets"), "tech" (time x I), "class" (time x namesW, i.e. existing,
+    retrofit and new), "total" and "cumulative"; plus the "time" index.
+    """
+    em_file = getFiles("*_em.xlsx")
+    if not em_file:
+        raise Exception("*_em.xlsx not found")
+    sheets = emissionSheets()
+    sums = streamRowSums(em_file, sheets)
+    time = sums[sheets[0]].index
+    em = np.column_stack([sums[s].reindex(time).to_numpy(float)
+                          for s in sheets])
+    tech = np.array([int(s.split("_")[1]) for s in sheets])
+    cls = np.array([namesW.index(s.split("_")[0][:-1]) for s in sheets])
+    byTech = np.zeros((len(time), I))
+    np.add.at(byTech.T, tech, em.T)
+    byClass = np.zeros((len(time), len(namesW)))
+    np.add.at(byClass.T, cls, em.T)
+    total = em.sum(axis=1)
+    return {"time": time.to_numpy(), "sheets": sheets, "sheet": em,
+            "tech": byTech, "class": byClass, "total": total,
+            "cumulative": np.cumsum(total)}
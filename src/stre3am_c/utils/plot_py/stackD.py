@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2023, UChicago Argonne, LLC
+# All Rights Reserved
+# Software Name: STRE3AM: Strategic Technology Roadmapping and Energy,
+# Environmental, and Economic Analysis Model
+# By: Argonne National Laboratory
+# BSD OPEN SOURCE LICENSE
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+
+# ******************************************************************************
+# DISCLAIMER
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ******************************************************************************
+
+# vim: tabstop=2 shiftwidth=2 expandtab colorcolumn=80 tw=80
+
+# stackD.py
+# description: stacked bars drawn with one collection per column, shared by
+# the stre3am_c plots and the stre3am_d toy plots (only needs matplotlib and
+# numpy).
+#
+# log:
+#
+#
+#80#############################################################################
+
+import numpy as np
+import matplotlib as mpl
+from matplotlib.collections import PolyCollection
+from matplotlib.colors import to_rgba
+from typing import Tuple
+
+
+def stackedBars(a, x, heights, bottom=0e0, width: float=0.8,
+                align: str="center", colors: list=None, labels: list=None,
+                hatches: list=None, **kwargs) -> Tuple[list, np.ndarray]:
+    """Stacked bars on the axes `a`. The columns of `heights` (one row per
+    `x`) are stacked from `bottom` up, with all the bottoms computed by a
+    single cumulative sum. Every column is drawn as one PolyCollection rather
+    than a Rectangle per bar. `colors`, `labels` and `hatches` are given per
+    column, the rest of `kwargs` go to all the collections (e.g. edgecolor,
+    linewidth, alpha). Returns the collections and the top of the stack.
+    """
+    x = np.asarray(x, dtype=float)
+    h = np.asarray(heights, dtype=float).reshape(len(x), -1)
+    b0 = np.broadcast_to(np.asarray(bottom, dtype=float), x.shape)
+    # same summation order as adding the columns one at a time
+    edges = np.cumsum(np.column_stack([b0, h]), axis=1)
+    lower, upper = edges[:, :-1], edges[:, 1:]
+    x0 = x - width/2 if align == "center" else x
+    x0 = np.broadcast_to(x0[:, None], lower.shape)
+    x1 = x0 + width
+    # (x, column, corner, xy)
+    verts = np.stack([np.stack([x0, lower], axis=-1),
+                      np.stack([x0, upper], axis=-1),
+                      np.stack([x1, upper], axis=-1),
+                      np.stack([x1, lower], axis=-1)], axis=2)
+    if colors is None:
+        colors = cycleColors(h.shape[1])
+    # as with bar, alpha goes to the face and edges but not to the hatch
+    alpha = kwargs.pop("alpha", None)
+    for key in ["edgecolor", "ec"]:
+        if key in kwargs and alpha is not None:
+            kwargs[key] = to_rgba(kwargs[key], alpha)
+    bars = []
+    for j in range(h.shape[1]):
+        opts = dict(kwargs)
+        if labels is not None:
+            opts["label"] = labels[j]
+        if hatches is not None:
+            opts["hatch"] = hatches[j]
+        col = PolyCollection(verts[:, j], closed=True,
+                             facecolor=to_rgba(colors[j], alpha), **opts)
+        # like bar, keep the margins from going below the bottoms
+        bj = lower[:, j]
+        col.sticky_edges.y[:] = np.unique(bj[np.isfinite(bj)]).tolist()
+        a.add_collection(col, autolim=True)
+        bars.append(col)
+    a.autoscale_view()
+    return bars, upper[:, -1] if h.shape[1] > 0 else b0.copy()
+
+
+def cycleColors(n: int) -> list:
+    """First `n` colours of the property cycle (repeated if needed).
+    """
+    cycle = mpl.rcParams["axes.prop_cycle"].by_key()["color"]
+    return [cycle[j % len(cycle)] for j in range(n)]
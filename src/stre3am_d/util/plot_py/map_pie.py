@@ -44,6 +44,12 @@ import geopandas as gpd
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
+import os
+import sys
+
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "../toy/"))
+from results import kl_frame, cap_tensor
 
 __author__ = "David Thierry @dthierry"
 
@@ -59,31 +65,15 @@ def cap_matrix(rf):
         raise("The number of techs mismatch")
 
 
-    dfr = pd.read_csv(cprf)
-    dfn = pd.read_csv(cpnf)
+    dfr = kl_frame(pd.read_csv(cprf))
+    dfn = kl_frame(pd.read_csv(cpnf))
     #
     n_loc = dinfo.loc[0, "n_loc"]
     n_tech = dinfo.loc[0, "n_rtft"]
     n_tp = dfr.shape[0]
     #
-    cap = np.zeros([n_loc, n_tech, n_tp])
-    #
-    # navigate by col
-    for col in range(1, dfr.shape[1]):
-        y = dfr.iloc[:, col]
-        name = y.name.split("_")
-        k = int(name[1])-1
-        l = int(name[3])-1
-        for row in range(y.shape[0]):
-            cap[l, k, row] += y.iloc[row]
-    for col in range(1, dfn.shape[1]):
-        y = dfn.iloc[:, col]
-        name = y.name.split("_")
-        k = int(name[1])-1
-        l = int(name[3])-1
-        for row in range(y.shape[0]):
-            cap[l, k, row] += y.iloc[row]
-    return cap, (n_tp, n_loc, n_tech), dfr.iloc[:, 0]
+    cap = cap_tensor([dfr, dfn], n_loc, n_tech)
+    return cap, (n_tp, n_loc, n_tech), pd.Series(dfr.index)
 
 # plant file
 plant_f = "/Users/dthierry/Projects/dr3milp/src/ins_07_29/softX/fac_.csv"
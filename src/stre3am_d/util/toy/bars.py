@@ -45,6 +45,13 @@ import numpy as np
 import datetime
 import os
 import sys
+from results import read_result, read_kl, rescale_stre3am
+
+# the stacked bars are shared with the stre3am_c plots (stackD only needs
+# matplotlib and numpy)
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "../../../stre3am_c/utils/plot_py/"))
+from stackD import stackedBars as stacked_bars
 
 __author__ = "David Thierry @dthierry"
 
@@ -113,9 +120,9 @@ def all_bars(rf, fmt):
     rlf = rf + "/retro_labels.csv"
     nlf = rf + "/new_labels.csv"
 
-    drl = pd.read_csv(rlf)
+    drl = read_result(rlf, typed=False)
     labr = drl.iloc[:,0].to_list()
-    dnl = pd.read_csv(nlf)
+    dnl = read_result(nlf, typed=False)
     labn = dnl.iloc[:,0].to_list()
 
     x_label = "Subperiod"
@@ -137,7 +144,7 @@ def all_bars(rf, fmt):
 # 80############################################################################
 def plot_emisions(rf, folder, fmt, xaxislabel=None):
     emf = rf +"/em.csv"
-    df = pd.read_csv(emf)
+    df = read_result(emf)
 
     infof = rf + "/s_info.csv"
     df = rescale_stre3am(df, infof, "em")
@@ -206,13 +213,13 @@ def plot_capture_relased_em(rf, folder, fmt, xaxislabel=None):
     rups = rf + "/do_ups_e_mt_in.csv"
     infof = rf + "/s_info.csv"
 
-    drcpe = pd.read_csv(rcpe)
+    drcpe = read_result(rcpe)
     drcpe = rescale_stre3am(drcpe, infof, "em")
-    drfue = pd.read_csv(rfue)
+    drfue = read_result(rfue)
     drfue = rescale_stre3am(drfue, infof, "em")
-    drep1 = pd.read_csv(rep1)
+    drep1 = read_result(rep1)
     drep1 = rescale_stre3am(drep1, infof, "em")
-    drups = pd.read_csv(rups)
+    drups = read_result(rups)
     drups = rescale_stre3am(drups, infof, "em")
 
     # new plants
@@ -221,13 +228,13 @@ def plot_capture_relased_em(rf, folder, fmt, xaxislabel=None):
     nep1 = rf + "/dnep1_.csv"
     nups = rf + "/dn_ups_e_mt_in.csv"
 
-    dncpe = pd.read_csv(ncpe)
+    dncpe = read_result(ncpe)
     dncpe = rescale_stre3am(dncpe, infof, "em")
-    dnfue = pd.read_csv(nfue)
+    dnfue = read_result(nfue)
     dnfue = rescale_stre3am(dnfue, infof, "em")
-    dnep1 = pd.read_csv(nep1)
+    dnep1 = read_result(nep1)
     dnep1 = rescale_stre3am(dnep1, infof, "em")
-    dnups = pd.read_csv(nups)
+    dnups = read_result(nups)
     dnups = rescale_stre3am(dnups, infof, "em")
 
     f, a = plt.subplots(dpi=300)
@@ -340,13 +347,13 @@ def plot_capacities(rf, folder, colors_r, colors_n, labr, labn, fmt, xaxislabel=
     demf = rf + "/demand.csv"
     infof = rf + "/s_info.csv"
 
-    dfr = pd.read_csv(cprf)
+    dfr = read_result(cprf)
     dfr = rescale_stre3am(dfr, infof, "cap")
 
-    dfn = pd.read_csv(cpnf)
+    dfn = read_result(cpnf)
     dfn = rescale_stre3am(dfn, infof, "cap")
 
-    dfd = pd.read_csv(demf)
+    dfd = read_result(demf)
     dfd = rescale_stre3am(dfd, infof, "cap")
 
 
@@ -360,24 +367,24 @@ def plot_capacities(rf, folder, colors_r, colors_n, labr, labn, fmt, xaxislabel=
     f, a = plt.subplots(dpi=300)
     plt.ticklabel_format(axis="y", style="sci", scilimits=(0, 0))
 
-    b = pd.DataFrame([0.0 for i in range(dfr.shape[0])])
-    for i in range(1, dfr.shape[1]):
-        a.bar(xvals, dfr.iloc[:, i],
-              width=w, bottom=b.iloc[:, 0], label=labr[i-1],
-              align="edge", edgecolor="k", lw=1.5, color=colors_r[i-1])
-        b.iloc[:, 0] += dfr.iloc[:, i]
-
-    for i in range(1, dfn.shape[1]):
-        a.bar(xvals, dfn.iloc[:, i],
-              width=w, bottom=b.iloc[:, 0], label=labn[i-1],
-              align="edge", edgecolor="k", lw=1.5, color=colors_n[i-1],
-              hatch="//")
-        b.iloc[:, 0] += dfn.iloc[:, i]
-
-    ymax = b.max().max()
+    # the demand goes first in the legend (it is drawn above the bars)
     a.plot(xvals, dfd.iloc[:, 0],
            label="Demand", lw=2, color="blue", ls="--", marker="*")
 
+    b = np.zeros(dfr.shape[0])
+    nr, nn = dfr.shape[1] - 1, dfn.shape[1] - 1
+    bars, b = stacked_bars(a, xvals, dfr.iloc[:, 1:],
+                           width=w, bottom=b, labels=labr[:nr],
+                           align="edge", edgecolor="k", lw=1.5,
+                           colors=colors_r[:nr])
+
+    bars, b = stacked_bars(a, xvals, dfn.iloc[:, 1:],
+                           width=w, bottom=b, labels=labn[:nn],
+                           align="edge", edgecolor="k", lw=1.5,
+                           colors=colors_n[:nn], hatch="//")
+
+    ymax = b.max()
+
     a.set_title("Capacity(Active) and Demand")
 
     xlabel = xaxislabel if isinstance(xaxislabel, str) else "Period"
@@ -398,10 +405,10 @@ def plot_capacities(rf, folder, colors_r, colors_n, labr, labn, fmt, xaxislabel=
     #export_legend(legend_object, folder + "legend_cap-active", fmt)
 
     # installed capacity plot!
-    dfr0 = pd.read_csv(rcpbf)
+    dfr0 = read_result(rcpbf)
     dfr0 = rescale_stre3am(dfr0, infof, "cap")
 
-    dfn0 = pd.read_csv(nc0nf)
+    dfn0 = read_result(nc0nf)
     dfn0 = rescale_stre3am(dfn0, infof, "cap")
 
     if xaxislabel == "year":
@@ -414,24 +421,24 @@ def plot_capacities(rf, folder, colors_r, colors_n, labr, labn, fmt, xaxislabel=
     f, a = plt.subplots(dpi=300)
     plt.ticklabel_format(axis="y", style="sci", scilimits=(0, 0))
 
-    b = pd.DataFrame([0.0 for i in range(dfr0.shape[0])])
-    for i in range(1, dfr0.shape[1]):
-        a.bar(xvals, dfr0.iloc[:, i],
-              width=w, bottom=b.iloc[:, 0], label=labr[i-1],
-              align="edge", edgecolor="k", lw=1.5, color=colors_r[i-1])
-        b.iloc[:, 0] += dfr0.iloc[:, i]
-    # This neees to start at 2!!
-    for i in range(2, dfn0.shape[1]):
-        a.bar(xvals, dfn0.iloc[:, i],
-              width=w, bottom=b.iloc[:, 0], label=labn[i-1],
-              align="edge", edgecolor="k", lw=1.5, color=colors_n[i-1],
-              hatch="//")
-        b.iloc[:, 0] += dfn0.iloc[:, i]
-
-    ymax = b.max().max()
+    # the demand goes first in the legend (it is drawn above the bars)
     a.plot(xvals, dfd.iloc[:, 0],
            label="Demand", lw=2, color="blue", ls="--", marker="*")
 
+    b = np.zeros(dfr0.shape[0])
+    nr, nn = dfr0.shape[1] - 1, dfn0.shape[1] - 1
+    bars, b = stacked_bars(a, xvals, dfr0.iloc[:, 1:],
+                           width=w, bottom=b, labels=labr[:nr],
+                           align="edge", edgecolor="k", lw=1.5,
+                           colors=colors_r[:nr])
+    # This neees to start at 2!!
+    bars, b = stacked_bars(a, xvals, dfn0.iloc[:, 2:],
+                           width=w, bottom=b, labels=labn[1:nn],
+                           align="edge", edgecolor="k", lw=1.5,
+                           colors=colors_n[1:nn], hatch="//")
+
+    ymax = b.max()
+
     a.set_title("Capacity(Installed) and Demand")
 
     xlabel = xaxislabel if isinstance(xaxislabel, str) else "Period"
@@ -597,9 +604,9 @@ def plot_ep1(rf, folder, colors_r, colors_n, labr, labn, fmt, xaxislabel=None):
     demf = rf + "/demand.csv"
     infof = rf + "/s_info.csv"
 
-    drep1 = pd.read_csv(rep1f)
+    drep1 = read_result(rep1f)
     drep1 = rescale_stre3am(drep1, infof, "em")
-    dnep1 = pd.read_csv(nep1f)
+    dnep1 = read_result(nep1f)
     dnep1 = rescale_stre3am(dnep1, infof, "em")
 
     if xaxislabel == "year":
@@ -654,9 +661,9 @@ def plot_elec_by_tech(rf, folder, colors_r, colors_n, labr, labn, fmt, xaxislabe
     nuf = rf + "/dnu.csv"
     infof = rf + "/s_info.csv"
 
-    dru = pd.read_csv(ruf)
+    dru = read_result(ruf)
     dru = rescale_stre3am(dru, infof, "elec")
-    dnu = pd.read_csv(nuf)
+    dnu = read_result(nuf)
     dnu = rescale_stre3am(dnu, infof, "elec")
 
     if xaxislabel == "year":
@@ -713,7 +720,7 @@ def plot_cumulative_expansion(rf, folder, fmt, xaxislabel=None):
     ef = rf + "/dec_act.csv"
     infof = rf + "/s_info.csv"
 
-    de = pd.read_csv(ef)
+    de = read_result(ef)
     de = rescale_stre3am(de, infof, "cap")
 
     b = pd.Series(np.zeros(de.shape[0]))
@@ -775,48 +782,40 @@ def plot_bar_by_loc(rf, folder, colors_r, colors_n, labr, labn, fmt,
     demf = rf + "/demand.csv"
     infof = rf + "/s_info.csv"
 
-    dfr = pd.read_csv(cprf)
+    dfr = read_kl(cprf)
     dfr = rescale_stre3am(dfr, infof, "cap")
-    dfn = pd.read_csv(cpnf)
+    dfn = read_kl(cpnf)
     dfn = rescale_stre3am(dfn, infof, "cap")
-    dfd = pd.read_csv(demf)
+    dfd = read_result(demf)
     dfd = rescale_stre3am(dfd, infof, "cap")
 
     f, a = plt.subplots(dpi=300)
     plt.ticklabel_format(axis="y", style="sci", scilimits=(0, 0))
 
     if xaxislabel == "year":
-        xvals = dfr.iloc[:, 0]
-        w = (dfr.iloc[1, 0] - dfr.iloc[0, 0]) * 0.8
+        xvals = dfr.index
+        w = (dfr.index[1] - dfr.index[0]) * 0.8
     else:
         xvals = np.arange(1, dfr.shape[0]+1)
         w = 0.8
     #w = (dfr.iloc[1, 0] - dfr.iloc[0, 0]) * 0.8
 
-    b = pd.Series(np.zeros(dfr.shape[0]))
-
-    # column by column
-    for i in range(1, dfr.shape[1]):
-        y = dfr.iloc[:, i]
-        name = y.name.split("_")
-        cidx = int(name[1])
-        a.bar(xvals, dfr.iloc[:, i],
-              width=w, bottom=b, lw=0.5, color=colors_r[cidx-1],
-              align="edge", edgecolor="w")
-        b += dfr.iloc[:, i]
-        # if dfr.iloc[:, i].sum() > 1:
-        #     b += 1.0
-    for i in range(1, dfn.shape[1]):
-        y = dfn.iloc[:, i]
-        name = y.name.split("_")
-        cidx = int(name[1])
-        a.bar(xvals, dfn.iloc[:, i],
-              width=w, bottom=b, lw=0.5, color=colors_n[cidx-1],
-              align="edge", edgecolor="w", hatch="//")
-        b += dfn.iloc[:, i]
+    b = np.zeros(dfr.shape[0])
 
+    # all the (tech, location) columns at once, coloured by tech
+    cidx = dfr.columns.get_level_values("tech")
+    bars, b = stacked_bars(a, xvals, dfr,
+                           width=w, bottom=b, lw=0.5,
+                           colors=[colors_r[c-1] for c in cidx],
+                           align="edge", edgecolor="w")
+    cidx = dfn.columns.get_level_values("tech")
+    bars, b = stacked_bars(a, xvals, dfn,
+                           width=w, bottom=b, lw=0.5,
+                           colors=[colors_n[c-1] for c in cidx],
+                           align="edge", edgecolor="w", hatch="//")
 
-    ymax = b.max().max()
+
+    ymax = b.max()
     a.plot(xvals, dfd.iloc[:, 0],
            label="Demand", lw=2, color="darkred", ls="--", marker="*")
 
@@ -1111,21 +1110,21 @@ def plot_co2_cap_bar(rf, folder, fmt, xaxislabel=None):
     rep1 = rf + "/drep1_.csv"
     infof = rf + "/s_info.csv"
 
-    drcpe = pd.read_csv(rcpe)
+    drcpe = read_result(rcpe)
     drcpe = rescale_stre3am(drcpe, infof, "em")
-    drfue = pd.read_csv(rfue)
+    drfue = read_result(rfue)
     drfue = rescale_stre3am(drfue, infof, "em")
-    drep1 = pd.read_csv(rep1)
+    drep1 = read_result(rep1)
     drep1 = rescale_stre3am(drep1, infof, "em")
     # new plants
     ncpe = rf + "/dncpe.csv"
     nfue = rf + "/dnfue.csv"
     nep1 = rf + "/dnep1_.csv"
-    dncpe = pd.read_csv(ncpe)
+    dncpe = read_result(ncpe)
     dncpe = rescale_stre3am(dncpe, infof, "em")
-    dnfue = pd.read_csv(nfue)
+    dnfue = read_result(nfue)
     dnfue = rescale_stre3am(dnfue, infof, "em")
-    dnep1 = pd.read_csv(nep1)
+    dnep1 = read_result(nep1)
     dnep1 = rescale_stre3am(dnep1, infof, "em")
 
     f, a = plt.subplots(dpi=300)
@@ -1189,24 +1188,6 @@ def plot_co2_cap_bar(rf, folder, fmt, xaxislabel=None):
     export_legend(legend_object, folder + f"{figname}-leg", fmt)
     plt.close(f)
 
-def rescale_stre3am(df, info_csv, kind):
-    dinfo = pd.read_csv(info_csv)
-    col = ""
-    if kind == "em":
-        col = "sf_em"
-    elif kind == "cap":
-        col = "sf_cap"
-    elif kind == "cash":
-        col = "sf_cash"
-    elif kind == "heat":
-        col = "sf_heat"
-    elif kind == "elec":
-        col = "sf_elec"
-
-    sf_ = dinfo.loc[0, col]
-    df = df.apply(lambda x: x/sf_ if x.name != 'yr' else x, axis=0)
-    return df
-
 # 80############################################################################
 def plot_legend(rf, folder, colors_r, colors_n, labr, labn, fmt):
     f, a = plt.subplots(dpi=300)
@@ -1323,21 +1304,21 @@ def plot_en_bar(rf, folder, fmt, xaxislabel=None):
     uf = rf +"/u.csv"
     infof = rf + "/s_info.csv"
 
-    dinfo = pd.read_csv(infof)
+    dinfo = read_result(infof, typed=False)
     n_loc = dinfo.loc[0, "n_loc"]
     n_loc = dinfo.loc[0, "n_loc"]
 
     rfu = 3
     nfu = 3
-    drff = [pd.read_csv(rf+ f"/dr_f_{i}.csv") for i in range(1, n_loc+1)]
+    drff = [read_result(rf+ f"/dr_f_{i}.csv") for i in range(1, n_loc+1)]
     drff = [rescale_stre3am(drff[i], infof, "heat") for i in range(n_loc)]
-    dnff = [pd.read_csv(rf+ f"/dn_f_{i}.csv") for i in range(1, n_loc+1)]
+    dnff = [read_result(rf+ f"/dn_f_{i}.csv") for i in range(1, n_loc+1)]
     dnff = [rescale_stre3am(dnff[i], infof, "heat") for i in range(n_loc)]
 
-    drh = pd.read_csv(rf + "/drh.csv")
+    drh = read_result(rf + "/drh.csv")
     drh = rescale_stre3am(drh, infof, "heat")
 
-    dnh = pd.read_csv(rf + "/dnh.csv")
+    dnh = read_result(rf + "/dnh.csv")
     dnh = rescale_stre3am(dnh, infof, "heat")
 
 
@@ -1355,7 +1336,7 @@ def plot_en_bar(rf, folder, fmt, xaxislabel=None):
                 # nhf[row, f] += dnh.iloc[row, l]# * dnff[l-1].iloc[row, f+1]
                 nhf[row, f] += dnff[l-1].iloc[row, f+1]
 
-    df = pd.read_csv(uf)
+    df = read_result(uf)
     df = rescale_stre3am(df, infof, "elec")
 
     if xaxislabel == "year":
@@ -46,6 +46,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
 import datetime
+from results import read_result, read_kl, rescale_stre3am, cap_tensor
 
 
 __author__ = "David Thierry @dthierry"
@@ -58,24 +59,6 @@ def pltrcparams():
     plt.rcParams['figure.figsize'] = [sarang_size*ratio, sarang_size]
     plt.rcParams['font.sans-serif'] = "Helvetica"
 
-def rescale_stre3am(df, info_csv, kind):
-    dinfo = pd.read_csv(info_csv)
-    col = ""
-    if kind == "em":
-        col = "sf_em"
-    elif kind == "cap":
-        col = "sf_cap"
-    elif kind == "cash":
-        col = "sf_cash"
-    elif kind == "heat":
-        col = "sf_heat"
-    elif kind == "elec":
-        col = "sf_elec"
-
-    sf_ = dinfo.loc[0, col]
-    df = df.apply(lambda x: x/sf_ if x.name != 'yr' else x, axis=0)
-    return df
-
 def export_legend(legend, filename, fmt):
     """Put the legend in a {fmt} different file.
     """
@@ -97,16 +80,16 @@ def cap_matrix(rf):
 
     infof = rf + "/lrn_info.csv"
     s_info = rf + "/s_info.csv"
-    dinfo = pd.read_csv(infof)
+    dinfo = read_result(infof, typed=False)
 
 
     if dinfo.loc[0, "n_rtft"] != dinfo.loc[0, "n_new"]:
         raise("The number of techs mismatch")
 
 
-    dfr = pd.read_csv(cprf)
+    dfr = read_kl(cprf)
     dfr = rescale_stre3am(dfr, s_info, "cap")
-    dfn = pd.read_csv(cpnf)
+    dfn = read_kl(cpnf)
     dfn = rescale_stre3am(dfn, s_info, "cap")
     #
     n_loc = dinfo.loc[0, "n_loc"]
@@ -114,25 +97,9 @@ def cap_matrix(rf):
     n_nw = dinfo.loc[0, "n_new"]
     n_tp = dfr.shape[0]
     #
-    cap_r = np.zeros([n_loc, n_rf, n_tp])
-    cap_n = np.zeros([n_loc, n_nw, n_tp])
-    #
-    # navigate by col
-    for col in range(1, dfr.shape[1]):
-        y = dfr.iloc[:, col]
-        name = y.name.split("_")
-        k = int(name[1])-1
-        l = int(name[3])-1
-        for row in range(y.shape[0]):
-            cap_r[l, k, row] += y.iloc[row]
-    for col in range(1, dfn.shape[1]):
-        y = dfn.iloc[:, col]
-        name = y.name.split("_")
-        k = int(name[1])-1
-        l = int(name[3])-1
-        for row in range(y.shape[0]):
-            cap_n[l, k, row] += y.iloc[row]
-    return cap_r, cap_n, (n_tp, n_loc, n_rf, n_nw), dfr.iloc[:, 0]
+    cap_r = cap_tensor([dfr], n_loc, n_rf)
+    cap_n = cap_tensor([dfn], n_loc, n_nw)
+    return cap_r, cap_n, (n_tp, n_loc, n_rf, n_nw), pd.Series(dfr.index)
 
 
 def gen_map(res_folder, sample_folder, map_folder, fmt):
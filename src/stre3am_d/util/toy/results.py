@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023, UChicago Argonne, LLC
+# All Rights Reserved
+# Software Name: STRE3AM: Strategic Technology Roadmapping and Energy,
+# Environmental, and Economic Analysis Model
+# By: Argonne National Laboratory
+# BSD-3 OPEN SOURCE LICENSE
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+
+# ******************************************************************************
+# DISCLAIMER
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ******************************************************************************
+
+# vim: expandtab colorcolumn=80 tw=80
+
+# results.py
+# notes: cache of the csv files of a result folder, shared by the plots.
+# 80############################################################################
+
+import pandas as pd
+import numpy as np
+import os
+
+
+# 80############################################################################
+#: parsed csv files by result folder and file name
+_runs = {}
+
+
+def read_result(fname, typed=True):
+    """Read the csv file `fname` of a result folder. Each file is parsed
+    once, the following calls get a copy of the frame from memory. With
+    `typed`, the values are float64 and the `yr` column is int (if all the
+    years are whole). Use `typed=False` for the info, label and filter files.
+    """
+    folder, name = os.path.split(os.path.abspath(fname))
+    mtime = os.path.getmtime(fname)
+    run = _runs.setdefault(folder, {})
+    key = (name, typed)
+    if key not in run or run[key][0] != mtime:
+        df = pd.read_csv(fname)
+        if typed:
+            df = _set_dtypes(df)
+        run[key] = (mtime, df)
+    return run[key][1].copy()
+
+
+def _set_dtypes(df):
+    dtypes = {c: np.float64 for c in df.columns if c != "yr"}
+    df = df.astype(dtypes)
+    if "yr" in df.columns:
+        yr = df["yr"].to_numpy(dtype=np.float64)
+        if np.all(yr == np.round(yr)):
+            df["yr"] = yr.astype(np.int64)
+        else:
+            df["yr"] = yr
+    return df
+
+
+def kl_columns(columns):
+    """Return the (tech, loc) MultiIndex of the column names `k_{k}_l_{l}`,
+    or the loc Index of `l_{l}`. The numbers are ints, as in the names.
+    """
+    columns = pd.Index(columns)
+    kl = columns.str.extract(r"^k_(\d+)_l_(\d+)$")
+    if not kl.isna().any().any():
+        kl = kl.to_numpy(dtype=np.int64)
+        return pd.MultiIndex.from_arrays([kl[:, 0], kl[:, 1]],
+                                         names=["tech", "loc"])
+    l = columns.str.extract(r"^l_(\d+)$")[0]
+    if not l.isna().any():
+        return pd.Index(l.to_numpy(dtype=np.int64), name="loc")
+    raise Exception("The columns are not named k_{k}_l_{l} or l_{l}")
+
+
+def kl_frame(df):
+    """Index the frame `df` (first column is the year, the rest are named
+    `k_{k}_l_{l}` or `l_{l}`) by year, with the columns of kl_columns.
+    """
+    out = df.iloc[:, 1:].set_axis(kl_columns(df.columns[1:]), axis=1)
+    out.index = pd.Index(df.iloc[:, 0].to_numpy(), name="yr")
+    return out
+
+
+def kl_long(df):
+    """Tidy (yr, tech, loc, value) table of a frame from kl_frame.
+    """
+    levels = list(df.columns.names)
+    return df.stack(levels, future_stack=True).rename("value").reset_index()
+
+
+def read_kl(fname, long=False):
+    """Read a `k_{k}_l_{l}` or `l_{l}` file of a result folder (see
+    read_result) as a kl_frame, or as a tidy long table with `long`.
+    """
+    df = kl_frame(read_result(fname))
+    return kl_long(df) if long else df
+
+
+def cap_tensor(dfs, n_loc, n_tech):
+    """Add the `k_{k}_l_{l}` columns of the frames `dfs` (from kl_frame)
+    into a (loc, tech, time) array.
+    """
+    cap = np.zeros([n_loc, n_tech, dfs[0].shape[0]])
+    for df in dfs:
+        k = df.columns.get_level_values("tech").to_numpy() - 1
+        l = df.columns.get_level_values("loc").to_numpy() - 1
+        np.add.at(cap, (l, k), df.to_numpy(dtype=np.float64).T)
+    return cap
+
+
+#: scale factors by s_info.csv file
+_factors = {}
+
+#: scale factor of each kind of result
+_sf_kind = {"em": "sf_em",
+            "cap": "sf_cap",
+            "cash": "sf_cash",
+            "heat": "sf_heat",
+            "elec": "sf_elec"}
+
+
+def scale_factors(info_csv):
+    """Return the sf_* factors of the s_info.csv file `info_csv` as a dict,
+    the file is only read once per run.
+    """
+    key = os.path.abspath(info_csv)
+    mtime = os.path.getmtime(info_csv)
+    if key not in _factors or _factors[key][0] != mtime:
+        dinfo = read_result(info_csv, typed=False)
+        sf = {c: float(dinfo.loc[0, c]) for c in dinfo.columns
+              if c.startswith("sf_")}
+        _factors[key] = (mtime, sf)
+    return _factors[key][1]
+
+
+def rescale_stre3am(df, info_csv, kind):
+    """Divide all the columns of `df` but `yr` by the scale factor of `kind`
+    (em, cap, cash, heat or elec), returns a new frame.
+    """
+    sf_ = scale_factors(info_csv)[_sf_kind[kind]]
+    scaled = df.columns.get_level_values(0) != "yr"
+    values = df.loc[:, scaled].to_numpy(dtype=np.float64) / sf_
+    out = pd.DataFrame(values, index=df.index, columns=df.columns[scaled])
+    if not scaled.all():
+        out = pd.concat([df.loc[:, ~scaled], out], axis=1)[df.columns]
+    return out
+
+
+def clear_results(rf=None):
+    """Forget the files (and scale factors) of the result folder `rf`, or all
+    of them.
+    """
+    if rf is None:
+        _runs.clear()
+        _factors.clear()
+    else:
+        _runs.pop(os.path.abspath(rf), None)
+        _factors.pop(os.path.join(os.path.abspath(rf), "s_info.csv"), None)
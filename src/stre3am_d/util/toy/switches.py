@@ -46,6 +46,7 @@ import numpy as np
 import datetime
 import os
 import sys
+from results import read_result, read_kl, cap_tensor
 
 __author__ = "David Thierry @dthierry"
 
@@ -65,6 +66,39 @@ def hex_to_rgb(value):
     lv = len(value)
     return tuple(int(value[i:i + lv // 3], 16) for i in range(0, lv, lv // 3))
 
+def switch_tensor(dy, nloc, nk, filters, dyo=None):
+    """Return the (k, loc, t) switch states of the dyr/dyn frame `dy` (from
+    read_kl). The techs filtered out of a location are off, but at the first
+    location, which always exists. With `dyo` the plant also has to be on.
+    """
+    y = cap_tensor([dy], nloc, nk).transpose(1, 0, 2)
+    on = filters.to_numpy(dtype=bool)[:nloc, :nk].T.copy()
+    on[:, 0] = True
+    y = y * on[:, :, None]
+    if dyo is not None:
+        y = y * dyo.to_numpy().T[None, :, :]
+    return y
+
+
+def switch_matrix(y, colors):
+    """Colour the active tech of every (loc, t) of the switch states `y`
+    (the last k if more than one is on, k=0 if none). Only the first switch
+    to a k > 0 is kept, the following slices of the plant get colour 0.
+    Returns the (loc, t, rgb) matrix and the (loc, t) cells with more than
+    one switch on, up to the first switch.
+    """
+    nk, nloc, nt = y.shape
+    active = y > 0
+    k = np.where(active.any(axis=0),
+                 nk - 1 - np.argmax(active[::-1], axis=0), 0)
+    switched = active[1:].any(axis=0)
+    first = np.where(switched.any(axis=1), np.argmax(switched, axis=1), nt)
+    kept = np.arange(nt)[None, :] <= first[:, None]
+    k[~kept] = 0
+    errors = np.argwhere((y.sum(axis=0) > 1) & kept)
+    return np.asarray(colors)[k], errors
+
+
 def plot_legend(folder, colors_r, colors_n, labr, labn, frmt):
     f, a = plt.subplots(dpi=300)
     for i in range(1, len(labr)):
@@ -117,12 +151,12 @@ def all_switches(f0, frmt):
     lrnf = f0 + "/lrn_info.csv"
 
 
-    dyo = pd.read_csv(dyof)
-    dye = pd.read_csv(dyef)
+    dyo = read_kl(dyof)
+    dye = read_kl(dyef)
 
-    dyr = pd.read_csv(dyrf)
-    dyn = pd.read_csv(dynf)
-    dlrn = pd.read_csv(lrnf)
+    dyr = read_kl(dyrf)
+    dyn = read_kl(dynf)
+    dlrn = read_result(lrnf, typed=False)
 
     colors_r = [
         "#ffffff",
@@ -155,14 +189,14 @@ def all_switches(f0, frmt):
     rfilter_f = f0 + "/retro_filters.csv"
     nfilter_f = f0 + "/new_filters.csv"
 
-    drl = pd.read_csv(rlf)
+    drl = read_result(rlf, typed=False)
     labr = drl.iloc[:,0].to_list()
-    dnl = pd.read_csv(nlf)
+    dnl = read_result(nlf, typed=False)
     labn = dnl.iloc[:,0].to_list()
 
 
-    rfilter = pd.read_csv(rfilter_f)
-    nfilter = pd.read_csv(nfilter_f)
+    rfilter = read_result(rfilter_f, typed=False)
+    nfilter = read_result(nfilter_f, typed=False)
 
     rtpc = [hex_to_rgb(i) for i in colors_r]
     ntpc = [hex_to_rgb(i) for i in colors_n]
@@ -174,25 +208,10 @@ def all_switches(f0, frmt):
     ntslices = nper * nsp
     ytick = [i for i in range(0,nloc)]
     ylab = [f"{i}" for i in range(1,nloc+1)]
-    ly = []
 
+    ly = switch_tensor(dyr, nloc, dlrn.loc[0, "n_rtft"], rfilter, dyo)
     for k in range(dlrn.loc[0, "n_rtft"]):
-        yr = dyr[f"k_{k+1}_l_1"]  # this one always exists
-        yo_l = dyo[f"l_1"].to_numpy()
-        yr = np.multiply(yr, yo_l)
-        for l in range(1, dlrn.loc[0, "n_loc"]):
-            if rfilter.iloc[l, k]:
-                c = f"k_{k+1}_l_{l+1}"
-                yr_l = dyr[c].to_numpy()
-                yo_l = dyo[f"l_{l+1}"].to_numpy()
-                yr_l = np.multiply(yr_l, yo_l)
-            else:
-                yr_l = np.zeros(dyr.shape[0])
-
-            yr = np.vstack((yr, yr_l))
-
-        ly.append(yr)
-        #yr = np.transpose(yr)
+        yr = ly[k]
 
         f, a = plt.subplots()#figsize=(5, 25))
 
@@ -216,26 +235,9 @@ def all_switches(f0, frmt):
                   format=frmt)
         plt.close(f)
 
-    matrix = [[rtpc[0] for col in range(ly[0].shape[1])] for row in range(ly[1].shape[0])]
-
-    skip_cols = False
-    for row in range(ly[0].shape[0]):
-        skip_cols = False  # we only want a single switch
-        for col in range(ly[0].shape[1]):
-            c = rtpc[0]
-            sum_elem = 0
-            for k in range(len(ly)): # retrofit
-                sum_elem += ly[k][row][col]
-                if ly[k][row][col] > 0:
-                    c = rtpc[k]
-                    #print(f"k={k}", c)
-                    if k > 0: #k=0 is the non rf/nw we have to skip it
-                        skip_cols = True
-            if sum_elem > 1:
-                print("this is an error")
-            matrix[row][col] = c
-            if skip_cols:
-                break
+    matrix, errors = switch_matrix(ly, rtpc)
+    if len(errors) > 0:
+        print(f"this is an error, more than one retrofit at {errors}")
 
     f, a = plt.subplots()#figsize=(5, 25))
 
@@ -268,19 +270,10 @@ def all_switches(f0, frmt):
     f.savefig(folder + f"legend_rf.{frmt}", bbox_inches=bbox, format=frmt)
 
     print(nfilter)
-    ly = []
+    ly = switch_tensor(dyn, nloc, dlrn.loc[0, "n_new"], nfilter)
     for k in range(dlrn.loc[0, "n_new"]):
-        yn = dyn[f"k_{k+1}_l_1"]
-        for l in range(1, dlrn.loc[0, "n_loc"]):
-            print(f"l={l}, k={k}, filter={nfilter.iloc[l,k]}")
-            if nfilter.iloc[l, k]:  # 06-30-2025 I had to correct this
-                c = f"k_{k+1}_l_{l+1}"
-                yn_l = dyn[c].to_numpy()
-            else:
-                yn_l = np.zeros(dyn.shape[0])
-            yn = np.vstack((yn, yn_l))
-
-        ly.append(yn)
+        yn = ly[k]
+
         #f, a = plt.subplots(figsize=(20, 5))
         #f, a = plt.subplots(figsize=(24, 8))
         f, a = plt.subplots()#figsize=(5, 25))
@@ -308,24 +301,9 @@ def all_switches(f0, frmt):
         plt.close(f)
 
 
-    matrix = [[ntpc[0] for col in range(ly[0].shape[1])] for row in range(ly[1].shape[0])]
-
-    for row in range(ly[0].shape[0]):
-        skip_cols = False  # we only want a single switch
-        for col in range(ly[0].shape[1]):
-            c = ntpc[0]
-            sum_elem = 0
-            for k in range(len(ly)):
-                sum_elem += ly[k][row][col]
-                if ly[k][row][col] > 0:
-                    c = ntpc[k]
-                    if k > 0: #k=0 is the non rf/nw we have to skip it
-                        skip_cols = True
-            if sum_elem > 1:
-                print("this is an error")
-            matrix[row][col] = c
-            if skip_cols:
-                break
+    matrix, errors = switch_matrix(ly, ntpc)
+    if len(errors) > 0:
+        print(f"this is an error, more than one new plant at {errors}")
 
 
 
@@ -365,7 +343,7 @@ def all_switches(f0, frmt):
 
     ntslices = nper * nsp
 
-    yo_l = dyo.iloc[:,1:].to_numpy()
+    yo_l = dyo.to_numpy()
 
     yo = np.transpose(yo_l)
 
@@ -423,8 +401,8 @@ def all_switches(f0, frmt):
     f.savefig(folder + f"on.{frmt}", dpi=200, transparent=True, format=frmt)
     plt.close(f)
 
-    ye_l = dye.iloc[:,1:].to_numpy()
-    yo_l = dyo.iloc[:,1:].to_numpy()
+    ye_l = dye.to_numpy()
+    yo_l = dyo.to_numpy()
 
     ye_l = np.multiply(ye_l, yo_l)
     ye = np.transpose(ye_l)
@@ -491,7 +469,7 @@ def all_switches(f0, frmt):
 
     ###
 
-    drl = pd.read_csv(rlf)
+    drl = read_result(rlf, typed=False)
     labr = drl.iloc[:,0].to_list()
     plot_legend(folder, colors_r, colors_n, labr, labn, frmt)
 